@@ -3,19 +3,14 @@ Admin initialization script
 Run this to set up admin collections and default data
 """
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from db_provider import client, db
+from analytics import record_order_change
 from datetime import datetime
-import bcrypt
+from passwords import hash_password
 
 async def init_admin_data():
     """Initialize admin collections with sample data"""
     
-    # MongoDB connection
-    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ.get('DB_NAME', 'bazari_db')]
-    
     # Collections
     admin_users_collection = db.admin_users
     orders_collection = db.orders
@@ -28,7 +23,7 @@ async def init_admin_data():
     admin_count = await admin_users_collection.count_documents({})
     if admin_count == 0:
         # Create default admin user
-        password_hash = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = await hash_password("admin123")
         
         default_admin = {
             "id": "admin-001",
@@ -145,6 +140,8 @@ async def init_admin_data():
         ]
         
         await orders_collection.insert_many(sample_orders)
+        for order in sample_orders:
+            await record_order_change(None, order)
         print(f"✅ Created {len(sample_orders)} sample orders")
     else:
         print("✅ Orders already exist")
@@ -0,0 +1,257 @@
+"""
+Admin dashboard metrics, sales time series and best sellers.
+
+Order metrics are summed from the daily rollups in order_rollups.py. The
+product and seller counts run concurrently with them. The finished
+snapshot is cached for a few seconds, so any number of open dashboards
+cost the database one computation per TTL window.
+
+Sales series build day/week/month buckets from the rollups too. Hourly
+buckets need raw orders and come from a single `$group` on `$dateTrunc`
+(MongoDB 5.0+). Buckets follow the timezone in the system settings and
+empty ones are filled with zeros here.
+
+Best sellers sum the per-product daily rollups over the window and are
+cached for a minute.
+
+A rollup rebuild (after a timezone change) runs in the background and
+holds `order_write_lock` while it reads the orders, so an order written
+meanwhile is neither missed by the rebuild nor counted twice by its own
+`$inc`. The lock only covers this process; rebuild with the CLI in
+`order_rollups.py` while writes are paused if several workers take orders.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from cache import TTLCache
+from database import products_collection, sellers_collection, count_documents_cached
+from db_provider import db
+from order_rollups import rollups_collection, product_rollups_collection, apply_order_change, backfill, local_day, DAY_FORMAT
+
+logger = logging.getLogger(__name__)
+
+orders_collection = db.orders
+settings_collection = db.settings
+
+LOW_STOCK_THRESHOLD = 10
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.environ.get('DASHBOARD_CACHE_TTL_SECONDS', '15'))
+dashboard_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL_SECONDS, max_size=8)
+
+# Reporting timezone from SystemSettings; cleared when settings change
+DEFAULT_TIMEZONE = "Asia/Riyadh"
+settings_cache = TTLCache(ttl=300, max_size=1)
+
+# Best sellers over a window of days, from the product sales rollups
+TOP_PRODUCTS_CACHE_TTL_SECONDS = float(os.environ.get('TOP_PRODUCTS_CACHE_TTL_SECONDS', '60'))
+top_products_cache = TTLCache(ttl=TOP_PRODUCTS_CACHE_TTL_SECONDS, max_size=64)
+# Orders in these statuses are not counted as sales
+EXCLUDED_SALES_STATUSES = ["cancelled"]
+
+# Held around an order write and its rollup update, and during a rebuild
+order_write_lock = asyncio.Lock()
+_rebuild_task: Optional[asyncio.Task] = None
+_rebuild_requested = False
+
+GRANULARITIES = ("hour", "day", "week", "month")
+BUCKET_LABELS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m"}
+
+async def get_reporting_timezone() -> str:
+    """Timezone name configured in the system settings"""
+    async def load():
+        settings = await settings_collection.find_one({}, {"_id": 0, "timezone": 1})
+        name = (settings or {}).get("timezone") or DEFAULT_TIMEZONE
+        try:
+            ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            name = "UTC"
+        return name
+    
+    return await settings_cache.get_or_load("timezone", load)
+
+def _to_utc(local: datetime) -> datetime:
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _truncate(local: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing a timezone-aware local time"""
+    if granularity == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        # Python weeks start on Monday; shift so they start on Sunday
+        return day - timedelta(days=(day.weekday() + 1) % 7)
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(local: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return local + timedelta(hours=1)
+    if granularity == "week":
+        return local + timedelta(days=7)
+    if granularity == "month":
+        return local.replace(year=local.year + local.month // 12, month=local.month % 12 + 1)
+    return local + timedelta(days=1)
+
+
+async def _order_metrics(today: str) -> Dict[str, Any]:
+    is_today = {"$eq": ["$day", today]}
+    pipeline = [
+        {"$group": {
+            "_id": None,
+            "total_orders": {"$sum": "$orders"},
+            "total_revenue": {"$sum": "$revenue"},
+            "orders_today": {"$sum": {"$cond": [is_today, "$orders", 0]}},
+            "revenue_today": {"$sum": {"$cond": [is_today, "$revenue", 0]}},
+            "pending_orders": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, "$orders", 0]}}
+        }}
+    ]
+    result = await rollups_collection.aggregate(pipeline).to_list(1)
+    if not result:
+        return {"total_orders": 0, "total_revenue": 0.0, "orders_today": 0, "revenue_today": 0.0, "pending_orders": 0}
+    metrics = result[0]
+    metrics.pop("_id")
+    return metrics
+
+async def compute_dashboard_stats() -> Dict[str, Any]:
+    """Compute every dashboard figure; independent collections run concurrently"""
+    today = local_day(datetime.utcnow(), await get_reporting_timezone())
+    orders, total_products, total_sellers, low_stock_products = await asyncio.gather(
+        _order_metrics(today),
+        count_documents_cached(products_collection, {}),
+        count_documents_cached(sellers_collection, {}),
+        count_documents_cached(products_collection, {"stockQuantity": {"$lt": LOW_STOCK_THRESHOLD}})
+    )
+    return {
+        **orders,
+        "total_customers": 0,  # Will implement with user system
+        "total_products": total_products,
+        "total_sellers": total_sellers,
+        "low_stock_products": low_stock_products
+    }
+
+async def get_dashboard_snapshot() -> Dict[str, Any]:
+    """Dashboard snapshot, recomputed at most once per cache TTL"""
+    return await dashboard_cache.get_or_load("dashboard", compute_dashboard_stats)
+
+async def _hourly_buckets(start: datetime, tz_name: str) -> Dict[datetime, Dict[str, Any]]:
+    pipeline = [
+        {"$match": {"created_at": {"$gte": _to_utc(start)}}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$created_at", "unit": "hour", "timezone": tz_name}},
+            "sales": {"$sum": "$total"},
+            "orders": {"$sum": 1}
+        }}
+    ]
+    return {bucket["_id"]: bucket async for bucket in orders_collection.aggregate(pipeline)}
+
+async def _rollup_buckets(start: datetime, granularity: str, tz: ZoneInfo) -> Dict[datetime, Dict[str, Any]]:
+    pipeline = [
+        {"$match": {"day": {"$gte": start.strftime(DAY_FORMAT)}}},
+        {"$group": {"_id": "$day", "sales": {"$sum": "$revenue"}, "orders": {"$sum": "$orders"}}}
+    ]
+    buckets: Dict[datetime, Dict[str, Any]] = {}
+    async for row in rollups_collection.aggregate(pipeline):
+        day = datetime.strptime(row["_id"], DAY_FORMAT).replace(tzinfo=tz)
+        bucket = buckets.setdefault(_to_utc(_truncate(day, granularity)), {"sales": 0.0, "orders": 0})
+        bucket["sales"] += row["sales"]
+        bucket["orders"] += row["orders"]
+    return buckets
+
+async def get_sales_series(days: int = 7, granularity: str = "day") -> List[Dict[str, Any]]:
+    """Revenue and order count per bucket over the last `days` days, oldest first"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    tz_name = await get_reporting_timezone()
+    tz = ZoneInfo(tz_name)
+    now = datetime.now(tz)
+    first_day = _truncate(now, "day") - timedelta(days=days - 1)
+    start = _truncate(first_day, granularity)
+    
+    if granularity == "hour":
+        buckets = await _hourly_buckets(start, tz_name)
+    else:
+        buckets = await _rollup_buckets(start, granularity, tz)
+    
+    series = []
+    bucket_start = start
+    while bucket_start <= now:
+        bucket = buckets.get(_to_utc(bucket_start), {})
+        series.append({
+            "date": bucket_start.strftime(BUCKET_LABELS[granularity]),
+            "sales": bucket.get("sales", 0.0),
+            "orders": bucket.get("orders", 0)
+        })
+        bucket_start = _next_bucket(bucket_start, granularity)
+    return series
+
+async def record_order_change(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+    """Keep the rollups in step with an order write"""
+    await apply_order_change(before, after, await get_reporting_timezone())
+    dashboard_cache.clear()
+
+async def rebuild_order_rollups():
+    """Rebuild the rollups from raw orders in the current reporting timezone"""
+    async with order_write_lock:
+        await backfill(await get_reporting_timezone())
+    dashboard_cache.clear()
+    top_products_cache.clear()
+
+async def _run_rebuilds():
+    global _rebuild_requested
+    while _rebuild_requested:
+        _rebuild_requested = False
+        try:
+            await rebuild_order_rollups()
+        except Exception:
+            logger.exception("Rebuilding order rollups failed")
+
+def schedule_rollup_rebuild():
+    """Rebuild the rollups in the background.
+
+    Requests made while a rebuild runs are coalesced into one more rebuild,
+    which picks up the latest timezone.
+    """
+    global _rebuild_task, _rebuild_requested
+    _rebuild_requested = True
+    if _rebuild_task is None or _rebuild_task.done():
+        _rebuild_task = asyncio.get_running_loop().create_task(_run_rebuilds())
+
+async def get_top_products(days: int = 30, limit: int = 5, by: str = "units") -> List[Dict[str, Any]]:
+    """Best selling products over the last `days` days, ranked by units or revenue"""
+    if by not in ("units", "revenue"):
+        raise ValueError(f"Unknown ranking: {by}")
+    
+    async def load():
+        tz = ZoneInfo(await get_reporting_timezone())
+        first_day = (_truncate(datetime.now(tz), "day") - timedelta(days=days - 1)).strftime(DAY_FORMAT)
+        pipeline = [
+            {"$match": {"day": {"$gte": first_day}, "status": {"$nin": EXCLUDED_SALES_STATUSES}}},
+            {"$sort": {"day": 1}},
+            {"$group": {
+                "_id": "$product_id",
+                "units": {"$sum": "$units"},
+                "revenue": {"$sum": "$revenue"},
+                "title": {"$last": "$product_title"},
+                "image": {"$last": "$product_image"}
+            }},
+            {"$match": {"units": {"$gt": 0}}},
+            {"$sort": {by: -1, "_id": 1}},
+            {"$limit": limit}
+        ]
+        return [
+            {
+                "id": row["_id"],
+                "title": row.get("title") or "",
+                "image": row.get("image") or "",
+                "sales_count": row["units"],
+                "revenue": row["revenue"]
+            }
+            async for row in product_rollups_collection.aggregate(pipeline)
+        ]
+    
+    return await top_products_cache.get_or_load((days, limit, by), load)
@@ -0,0 +1,102 @@
+"""
+Microbenchmark for the product list response pipeline.
+
+Compares, for a 100-item page, the previous per-request work (recursive
+convert_objectid, ProductModel validation, jsonable_encoder, json.dumps)
+with the shared pipeline in serialization.py (_id excluded by projection,
+documents encoded directly to bytes).
+
+    python bench_serialization.py [--items 100] [--rounds 200]
+"""
+import argparse
+import json
+import timeit
+import uuid
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from models import ProductModel
+from serialization import dumps, orjson
+
+def sample_product(index: int):
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"هاتف سامسونج جالاكسي S24 رقم {index}",
+        "titleEn": f"Samsung Galaxy S24 #{index}",
+        "price": 3299.0 + index,
+        "originalPrice": 3599.0,
+        "currency": "ر.س",
+        "rating": 4.8,
+        "reviewCount": 234,
+        "image": "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?auto=format&fit=crop&w=800&q=80",
+        "images": [
+            "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?auto=format&fit=crop&w=800&q=80",
+            "https://images.unsplash.com/photo-1592899677977-9c10ca588bbd?auto=format&fit=crop&w=800&q=80"
+        ],
+        "categoryId": "1",
+        "sellerId": "1",
+        "description": "هاتف سامسونج جالاكسي S24 الجديد مع أحدث التقنيات وكاميرا عالية الجودة. " * 3,
+        "specifications": [
+            {"key": "الشاشة", "value": "6.2 بوصة Dynamic AMOLED"},
+            {"key": "المعالج", "value": "Snapdragon 8 Gen 3"},
+            {"key": "الذاكرة", "value": "8GB RAM, 256GB"},
+            {"key": "الكاميرا", "value": "50MP + 12MP + 10MP"},
+            {"key": "البطارية", "value": "4000mAh"}
+        ],
+        "inStock": True,
+        "stockQuantity": 15,
+        "discount": 8,
+        "isNew": True,
+        "isFeatured": True,
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow()
+    }
+
+def legacy_convert_objectid(data):
+    """The recursive helper each route module used to carry"""
+    if isinstance(data, dict):
+        if "_id" in data:
+            data.pop("_id", None)
+        return {key: legacy_convert_objectid(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [legacy_convert_objectid(item) for item in data]
+    else:
+        return data
+
+def legacy_pipeline(documents):
+    items = legacy_convert_objectid(documents)
+    models = [ProductModel(**item) for item in items]
+    return json.dumps(jsonable_encoder({"items": models, "total": len(models)})).encode("utf-8")
+
+def shared_pipeline(documents):
+    return dumps({"items": documents, "total": len(documents)})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    page = [sample_product(i) for i in range(args.items)]
+    # Documents as Mongo returns them: the legacy path still sees _id
+    with_id = [{"_id": object(), **product} for product in page]
+
+    # Both paths pay for the same shallow copy of the page
+    def run_legacy():
+        legacy_pipeline([dict(document) for document in with_id])
+
+    def run_shared():
+        shared_pipeline([dict(document) for document in page])
+
+    legacy = min(timeit.repeat(run_legacy, number=args.rounds, repeat=5)) / args.rounds
+    shared = min(timeit.repeat(run_shared, number=args.rounds, repeat=5)) / args.rounds
+
+    encoder = "orjson" if orjson is not None else "json"
+    print(f"{args.items}-item page, best of 5 x {args.rounds} rounds ({encoder})")
+    print(f"  legacy convert_objectid + ProductModel + jsonable_encoder: {legacy * 1000:8.3f} ms")
+    print(f"  shared projection + dumps:                              {shared * 1000:8.3f} ms")
+    print(f"  speedup: {legacy / shared:.1f}x")
+
+if __name__ == "__main__":
+    main()
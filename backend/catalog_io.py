@@ -0,0 +1,278 @@
+"""
+Bulk product import and export.
+
+Uploads are read row by row and written in fixed-size batches, and exports
+are streamed from a Mongo cursor in chunks, so memory use depends on the
+batch size rather than on the size of the catalog.
+"""
+import codecs
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models import ProductCreate, ProductModel
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+# Keep the error report bounded even for a file full of bad rows
+MAX_REPORTED_ERRORS = 1000
+
+# CSV columns that hold structured values
+_CSV_LIST_SEPARATOR = "|"
+
+def _iter_ndjson(stream) -> Iterator[Tuple[int, Any]]:
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+def _coerce_csv_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """Turn a flat CSV row into the shape ProductCreate expects"""
+    data: Dict[str, Any] = {key: value for key, value in row.items() if key and value not in (None, "")}
+    if "images" in data:
+        data["images"] = [image.strip() for image in data["images"].split(_CSV_LIST_SEPARATOR) if image.strip()]
+    if "specifications" in data:
+        data["specifications"] = json.loads(data["specifications"])
+    return data
+
+def _iter_csv(stream) -> Iterator[Tuple[int, Any]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        try:
+            yield reader.line_num, _coerce_csv_row(row)
+        except ValueError as e:
+            yield reader.line_num, ValueError(f"Invalid specifications JSON: {e}")
+
+class ImportFileError(ValueError):
+    """The upload cannot be read at all; nothing was written"""
+
+_ENCODING_CHECK_CHUNK = 64 * 1024
+
+def check_encoding(binary_stream):
+    """Make sure a seekable upload is UTF-8 before any row is written.
+
+    Spreadsheet exports are often in a legacy code page (cp1256 for
+    Arabic); rejecting those up front beats failing halfway through.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    line = 1
+    while True:
+        chunk = binary_stream.read(_ENCODING_CHECK_CHUNK)
+        try:
+            decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            near = line + chunk[:max(e.start, 0)].count(b"\n")
+            raise ImportFileError(f"File is not UTF-8 encoded (near line {near}); export it as CSV UTF-8")
+        if not chunk:
+            break
+        line += chunk.count(b"\n")
+    binary_stream.seek(0)
+
+def iter_rows(binary_stream, file_format: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, row dict or error) from an uploaded file"""
+    text_stream = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        return _iter_csv(text_stream)
+    return _iter_ndjson(text_stream)
+
+def _upsert_operation(product_id: str, product: ProductCreate, now: datetime) -> UpdateOne:
+    return UpdateOne(
+        {"id": product_id},
+        {
+            "$set": {**product.dict(), "updatedAt": now},
+            "$setOnInsert": {"id": product_id, "createdAt": now, "rating": 0.0, "reviewCount": 0}
+        },
+        upsert=True
+    )
+
+class ImportReport:
+    """Running totals and per-row errors for one import"""
+
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, row: int, error: Any):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def dict(self):
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errorsTruncated": self.failed > len(self.errors)
+        }
+
+async def _write_batch(collection, batch: List[Tuple[int, str, ProductCreate]], report: ImportReport, on_written):
+    now = datetime.utcnow()
+    operations = [_upsert_operation(product_id, product, now) for _, product_id, product in batch]
+    failed_indexes = set()
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        report.inserted += result.upserted_count
+        report.updated += result.matched_count
+    except BulkWriteError as e:
+        details = e.details
+        report.inserted += details.get("nUpserted", 0)
+        report.updated += details.get("nMatched", 0)
+        for write_error in details.get("writeErrors", []):
+            failed_indexes.add(write_error["index"])
+            report.add_error(batch[write_error["index"]][0], write_error.get("errmsg", "Write failed"))
+
+    for index, (_, product_id, product) in enumerate(batch):
+        if index not in failed_indexes:
+            on_written(product_id, product)
+
+async def import_products(collection, binary_stream, file_format: str, on_written) -> Dict[str, Any]:
+    """Validate and upsert products from an NDJSON or CSV stream.
+
+    Rows are keyed on `id` when present, otherwise a new id is generated.
+    `on_written(product_id, product)` is called for every stored row.
+    Raises ImportFileError, before writing anything, if the file is not UTF-8.
+    """
+    check_encoding(binary_stream)
+    report = ImportReport()
+    batch: List[Tuple[int, str, ProductCreate]] = []
+
+    for row_number, row in iter_rows(binary_stream, file_format):
+        report.processed += 1
+        if isinstance(row, Exception):
+            report.add_error(row_number, str(row))
+            continue
+        if not isinstance(row, dict):
+            report.add_error(row_number, "Row must be an object")
+            continue
+
+        product_id = str(row.pop("id", None) or uuid.uuid4())
+        try:
+            product = ProductCreate(**row)
+        except ValidationError as e:
+            report.add_error(row_number, e.errors(include_url=False, include_context=False, include_input=False))
+            continue
+
+        batch.append((row_number, product_id, product))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await _write_batch(collection, batch, report, on_written)
+            batch = []
+
+    if batch:
+        await _write_batch(collection, batch, report, on_written)
+
+    return report.dict()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, list):
+        return _CSV_LIST_SEPARATOR.join(str(item) for item in value)
+    return value
+
+# Export columns, in the same layout the CSV import reads back
+EXPORT_FIELDS = list(ProductModel.model_fields)
+
+# An export position: the (updatedAt, id) of a row in export order
+Watermark = Tuple[datetime, str]
+
+def build_export_filter(
+    categoryId: Optional[str] = None,
+    sellerId: Optional[str] = None,
+    updatedSince: Optional[datetime] = None,
+    after: Optional[Watermark] = None,
+    until: Optional[Watermark] = None
+) -> Dict[str, Any]:
+    """Filter for an export.
+
+    `updatedSince` is inclusive. `after` and `until` bound the export on
+    (updatedAt, id), exclusive and inclusive respectively, so rows sharing
+    one timestamp are never skipped or exported twice across runs.
+    """
+    filter_dict: Dict[str, Any] = {}
+    if categoryId:
+        filter_dict["categoryId"] = categoryId
+    if sellerId:
+        filter_dict["sellerId"] = sellerId
+    if updatedSince is not None:
+        filter_dict["updatedAt"] = {"$gte": updatedSince}
+    bounds = []
+    if after is not None:
+        bounds.append({"$or": [
+            {"updatedAt": {"$gt": after[0]}},
+            {"updatedAt": after[0], "id": {"$gt": after[1]}}
+        ]})
+    if until is not None:
+        bounds.append({"$or": [
+            {"updatedAt": {"$lt": until[0]}},
+            {"updatedAt": until[0], "id": {"$lte": until[1]}}
+        ]})
+    if bounds:
+        filter_dict["$and"] = bounds
+    return filter_dict
+
+async def export_watermark(collection, filter_dict: Dict[str, Any]) -> Optional[Watermark]:
+    """Position of the last row an export with this filter would write"""
+    latest = await collection.find_one(
+        filter_dict,
+        {"_id": 0, "updatedAt": 1, "id": 1},
+        sort=[("updatedAt", -1), ("id", -1)]
+    )
+    if latest is None or latest.get("updatedAt") is None:
+        return None
+    return latest["updatedAt"], latest["id"]
+
+async def export_products(collection, filter_dict: Dict[str, Any], file_format: str) -> AsyncIterator[bytes]:
+    """Stream matching products as NDJSON or CSV chunks.
+
+    Products are ordered by (updatedAt, id), the order `after` and
+    `until` in `build_export_filter` refer to.
+    """
+    projection = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+    cursor = collection.find(filter_dict, projection).sort([("updatedAt", 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+
+    buffer = io.StringIO()
+    writer = None
+    if file_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+
+    rows_in_chunk = 0
+    async for product in cursor:
+        if writer is not None:
+            writer.writerow({field: _csv_value(product.get(field)) for field in EXPORT_FIELDS})
+        else:
+            buffer.write(json.dumps(product, ensure_ascii=False, default=_json_default))
+            buffer.write("\n")
+        rows_in_chunk += 1
+
+        if rows_in_chunk >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows_in_chunk = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
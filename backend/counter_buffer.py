@@ -0,0 +1,109 @@
+"""
+Write-behind buffer for hot counters.
+
+Increments are summed in memory per document id and written with one
+unordered `bulk_write` of `$inc` updates, either every `flush_interval`
+seconds or as soon as `max_pending` distinct ids are waiting. A burst of
+clicks on one document becomes a single write per interval.
+
+What a crash can lose is bounded by both knobs: at most `flush_interval`
+seconds of increments, spread over at most `max_pending` documents. A
+failed flush puts the increments that were not applied back so the next
+flush retries them (after a partial BulkWriteError only the failed ones), but
+only up to `max_pending` ids in total; while the database stays down the
+counters of further ids are dropped (and logged) instead of piling up.
+Call `stop()` on shutdown to flush what is left.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+class CounterBuffer:
+    """Coalesces `$inc` updates of one field, keyed by document `id`"""
+
+    def __init__(self, collection, field: str, flush_interval: float = 2.0, max_pending: int = 1000):
+        self.collection = collection
+        self.field = field
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, int] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def increment(self, key: str, amount: int = 1):
+        self._pending[key] = self._pending.get(key, 0) + amount
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+
+    def pending(self, key: str) -> int:
+        """Increments for `key` not written yet"""
+        return self._pending.get(key, 0)
+
+    def discard(self, key: str):
+        """Drop unwritten increments, e.g. when the document is deleted"""
+        self._pending.pop(key, None)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            keys = list(batch)
+            try:
+                await self.collection.bulk_write(
+                    [UpdateOne({"id": key}, {"$inc": {self.field: batch[key]}}) for key in keys],
+                    ordered=False
+                )
+            except BulkWriteError as e:
+                # Unordered: every update not listed in writeErrors was applied
+                failed = {keys[error["index"]] for error in e.details.get("writeErrors", [])}
+                logger.error(f"Flushing {len(failed)} of {len(batch)} buffered {self.field} counters failed: {e}")
+                self._requeue({key: batch[key] for key in keys if key in failed})
+            except Exception as e:
+                logger.error(f"Flushing {len(batch)} buffered {self.field} counters failed: {e}")
+                self._requeue(batch)
+
+    def _requeue(self, batch: Dict[str, int]):
+        """Put a failed batch back without growing past `max_pending` ids"""
+        dropped = 0
+        for key, amount in batch.items():
+            if key in self._pending or len(self._pending) < self.max_pending:
+                self._pending[key] = self._pending.get(key, 0) + amount
+            else:
+                dropped += 1
+        if dropped:
+            logger.warning(f"Dropped buffered {self.field} counters of {dropped} ids; the buffer is full")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write everything still pending"""
+        # Let an in-flight flush finish instead of cancelling it mid-write
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
@@ -1,18 +1,12 @@
-from motor.motor_asyncio import AsyncIOMotorClient
 from models import CategoryModel, ProductModel, SellerModel, ReviewModel, BannerModel
+from cache import TTLCache
+from typing import Optional
 import os
+import json
+import base64
+import binascii
 from datetime import datetime
-from dotenv import load_dotenv
-from pathlib import Path
-
-# Load environment variables
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'bazari_db')]
+from db_provider import client, db
 
 # Collections
 categories_collection = db.categories
@@ -201,6 +195,11 @@ async def init_sample_data():
         }
     ]
     
+    # Detail endpoints derive ETags from updatedAt
+    now = datetime.utcnow()
+    for document in categories + sellers:
+        document.setdefault("updatedAt", now)
+    
     # Insert data
     await categories_collection.insert_many(categories)
     await sellers_collection.insert_many(sellers)
@@ -208,15 +207,160 @@ async def init_sample_data():
     
     print("Sample data initialized successfully!")
 
+async def backfill_updated_at():
+    """Give documents written before `updatedAt` existed one, so their ETags
+    come from the version lookup instead of a full fetch and hash"""
+    for collection in (categories_collection, sellers_collection, products_collection):
+        await collection.update_many(
+            {"updatedAt": {"$exists": False}},
+            [{"$set": {"updatedAt": {"$ifNull": ["$createdAt", "$$NOW"]}}}]
+        )
+
+# Totals for paginated listings, keyed by (collection, normalized filter)
+COUNT_CACHE_TTL_SECONDS = float(os.environ.get('COUNT_CACHE_TTL_SECONDS', '30'))
+count_cache = TTLCache(ttl=COUNT_CACHE_TTL_SECONDS, max_size=4096)
+
 # Utility functions
-async def get_paginated_results(collection, filter_dict, page: int, limit: int, sort_field: str = "createdAt", sort_order: int = -1):
-    """Get paginated results from a collection"""
+def _count_cache_key(collection, filter_dict):
+    return (collection.name, json.dumps(filter_dict, sort_keys=True, default=str))
+
+async def count_documents_cached(collection, filter_dict):
+    """Count documents matching a filter, served from a short-lived cache.
+
+    Unfiltered listings use the collection metadata count instead of a scan.
+    """
+    async def load():
+        if not filter_dict:
+            return await collection.estimated_document_count()
+        return await collection.count_documents(filter_dict)
+    
+    return await count_cache.get_or_load(_count_cache_key(collection, filter_dict), load)
+
+def invalidate_counts(collection):
+    """Drop cached totals for a collection after a write"""
+    count_cache.invalidate_where(lambda key: key[0] == collection.name)
+
+def encode_cursor(sort_value, item_id: str, direction: str) -> str:
+    """Build an opaque pagination token from the sort key of a boundary item"""
+    if isinstance(sort_value, datetime):
+        sort_value = {"$date": sort_value.isoformat()}
+    payload = json.dumps({"v": sort_value, "id": item_id, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+_CURSOR_SCALARS = (str, int, float, bool)
+
+class InvalidCursorError(ValueError):
+    """A pagination token that was not issued by `encode_cursor`; the API answers 400"""
+
+def decode_cursor(token: str):
+    """Decode a pagination token into (sort value, id, direction)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        sort_value = payload["v"]
+        item_id = payload["id"]
+        # Both values end up in the Mongo filter, so only plain scalars pass
+        if isinstance(sort_value, dict):
+            if set(sort_value) != {"$date"} or not isinstance(sort_value["$date"], str):
+                raise ValueError(sort_value)
+            sort_value = datetime.fromisoformat(sort_value["$date"])
+        elif sort_value is not None and not isinstance(sort_value, _CURSOR_SCALARS):
+            raise ValueError(sort_value)
+        if not isinstance(item_id, str):
+            raise ValueError(item_id)
+        direction = payload.get("d", "next")
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return sort_value, item_id, direction
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeError):
+        raise InvalidCursorError("Invalid pagination cursor")
+
+def _keyset_boundary(sort_field: str, sort_value, item_id: str, op: str) -> dict:
+    """Filter for the rows after (sort_value, item_id) in the walk direction.
+
+    MongoDB sorts null and missing values below everything, but `$gt`/`$lt`
+    against a value never match them, so null boundaries are spelled out.
+    """
+    if sort_value is None:
+        if op == "$gt":
+            return {"$or": [{sort_field: {"$ne": None}}, {sort_field: None, "id": {"$gt": item_id}}]}
+        return {sort_field: None, "id": {"$lt": item_id}}
+    branches = [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, "id": {op: item_id}}
+    ]
+    if op == "$lt":
+        branches.append({sort_field: None})
+    return {"$or": branches}
+
+async def get_keyset_results(collection, filter_dict, limit: int, cursor: str, sort_field: str = "createdAt", sort_order: int = -1, with_total: bool = True, projection: Optional[dict] = None):
+    """Get one page using keyset pagination on (sort_field, id).
+
+    An empty cursor starts at the first page. Every page costs one indexed
+    range scan of `limit + 1` documents, however deep it is.
+    """
+    direction = "next"
+    query = filter_dict
+    if cursor:
+        sort_value, item_id, direction = decode_cursor(cursor)
+        # Walking backwards flips the comparison and the sort order
+        forward = sort_order if direction == "next" else -sort_order
+        op = "$gt" if forward == 1 else "$lt"
+        boundary = _keyset_boundary(sort_field, sort_value, item_id, op)
+        query = {"$and": [filter_dict, boundary]} if filter_dict else boundary
+
+    order = sort_order if direction == "next" else -sort_order
+    cursor_obj = collection.find(query, projection).sort([(sort_field, order), ("id", order)]).limit(limit + 1)
+    items = await cursor_obj.to_list(limit + 1)
+    has_more = len(items) > limit
+    items = items[:limit]
+    if direction == "prev":
+        items.reverse()
+
+    # A next page exists if we saw one more item forward, or came back from it
+    has_next = has_more if direction == "next" else bool(cursor)
+    has_prev = bool(cursor) if direction == "next" else has_more
+
+    next_cursor = None
+    prev_cursor = None
+    if items and has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last["id"], "next")
+    if items and has_prev:
+        first = items[0]
+        prev_cursor = encode_cursor(first.get(sort_field), first["id"], "prev")
+
+    total = await count_documents_cached(collection, filter_dict) if with_total else None
+
+    return {
+        "items": items,
+        "total": total,
+        "limit": limit,
+        "next": next_cursor,
+        "prev": prev_cursor
+    }
+
+async def get_paginated_results(collection, filter_dict, page: int, limit: int, sort_field: str = "createdAt", sort_order: int = -1, cursor: Optional[str] = None, with_total: bool = True, projection: Optional[dict] = None):
+    """Get paginated results from a collection.
+
+    Passing `cursor` (an empty string for the first page) switches to keyset
+    pagination, which returns `next`/`prev` tokens instead of page numbers.
+    With `with_total=False` the count is skipped and `total` is None.
+    A `projection` must keep `id` and the sort field for cursors to work.
+    """
+    if cursor is not None:
+        return await get_keyset_results(collection, filter_dict, limit, cursor, sort_field, sort_order, with_total, projection)
+    
     skip = (page - 1) * limit
     
-    cursor = collection.find(filter_dict).sort(sort_field, sort_order).skip(skip).limit(limit)
-    items = await cursor.to_list(limit)
-    total = await collection.count_documents(filter_dict)
-    total_pages = (total + limit - 1) // limit
+    cursor_obj = collection.find(filter_dict, projection).sort(sort_field, sort_order).skip(skip).limit(limit)
+    items = await cursor_obj.to_list(limit)
+    
+    total = None
+    total_pages = None
+    if with_total:
+        total = await count_documents_cached(collection, filter_dict)
+        total_pages = (total + limit - 1) // limit
     
     return {
         "items": items,
@@ -224,4 +368,4 @@ async def get_paginated_results(collection, filter_dict, page: int, limit: int,
         "page": page,
         "limit": limit,
         "totalPages": total_pages
-    }
\ No newline at end of file
+    }
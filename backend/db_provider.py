@@ -0,0 +1,114 @@
+"""
+The process-wide MongoDB client.
+
+Every module gets its database handle from here, so the API runs on one
+connection pool that can be sized through the environment:
+
+    MONGO_MAX_POOL_SIZE             (default 100)
+    MONGO_MIN_POOL_SIZE             (default 0)
+    MONGO_MAX_IDLE_TIME_MS          (default unset)
+    MONGO_CONNECT_TIMEOUT_MS        (default 10000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS (default 10000)
+    MONGO_SOCKET_TIMEOUT_MS         (default unset)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS     (default unset)
+    MONGO_COMPRESSORS               e.g. "zstd,snappy,zlib" (default none)
+"""
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'souq_express_db')
+
+def _int_env(name: str, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+MONGO_MAX_POOL_SIZE = _int_env('MONGO_MAX_POOL_SIZE', 100)
+MONGO_MIN_POOL_SIZE = _int_env('MONGO_MIN_POOL_SIZE', 0)
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters, per server address"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _bump(self, address, **deltas):
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            counters = self._servers[key]
+            for name, delta in deltas.items():
+                counters[name] += delta
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            servers = {address: dict(counters) for address, counters in self._servers.items()}
+        for counters in servers.values():
+            counters["utilization"] = round(counters.get("checked_out", 0) / MONGO_MAX_POOL_SIZE, 3)
+        return {"maxPoolSize": MONGO_MAX_POOL_SIZE, "minPoolSize": MONGO_MIN_POOL_SIZE, "servers": servers}
+
+    def pool_created(self, event):
+        self._bump(event.address, pools_created=1)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, pools_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, open=1, created_total=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, open=-1, closed_total=1)
+
+    def connection_check_out_started(self, event):
+        self._bump(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, waiting=-1, checkout_failures_total=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, waiting=-1, checked_out=1, checkouts_total=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, checked_out=-1)
+
+def _client_options() -> Dict[str, Any]:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": _int_env('MONGO_MAX_IDLE_TIME_MS'),
+        "connectTimeoutMS": _int_env('MONGO_CONNECT_TIMEOUT_MS', 10000),
+        "serverSelectionTimeoutMS": _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000),
+        "socketTimeoutMS": _int_env('MONGO_SOCKET_TIMEOUT_MS'),
+        "waitQueueTimeoutMS": _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+    }
+    compressors = os.environ.get('MONGO_COMPRESSORS')
+    if compressors:
+        options["compressors"] = compressors
+    return {name: value for name, value in options.items() if value is not None}
+
+pool_metrics = PoolMetrics()
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[pool_metrics], **_client_options())
+db = client[DB_NAME]
+
+def get_database():
+    """Database handle shared by every router"""
+    return db
@@ -0,0 +1,141 @@
+"""
+Faceted product listing.
+
+Returns one page of products together with the counts the storefront
+sidebar needs (category, seller, price bucket and the boolean flags). The
+counts come from a single `$facet` aggregation and do not depend on the
+page, so they are cached per filter set while each page is a plain query.
+Search results are counted from the in-memory index instead.
+"""
+import bisect
+import json
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from cache import TTLCache
+
+# Lower bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = [0, 50, 100, 250, 500, 1000, 2500, 5000]
+_OPEN_BUCKET = "open"
+COUNTED_FIELDS = ("categoryId", "sellerId", "inStock", "isNew", "isFeatured")
+
+FACET_ITEM_PROJECTION = {"_id": 0, "ratingStats": 0}
+
+FACET_CACHE_TTL_SECONDS = float(os.environ.get('FACET_CACHE_TTL_SECONDS', '60'))
+facet_cache = TTLCache(ttl=FACET_CACHE_TTL_SECONDS, max_size=512)
+
+def facet_cache_key(params: Dict[str, Any]) -> str:
+    """Normalize request parameters into a cache key"""
+    return json.dumps({k: v for k, v in params.items() if v is not None}, sort_keys=True, default=str)
+
+def _count_by(field: str) -> List[Dict[str, Any]]:
+    return [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]
+
+def _build_pipeline(filter_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"$match": filter_dict},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "categoryId": _count_by("categoryId"),
+            "sellerId": _count_by("sellerId"),
+            "price": [{"$bucket": {
+                "groupBy": "$price",
+                "boundaries": PRICE_BUCKETS + [float("inf")],
+                "default": _OPEN_BUCKET,
+                "output": {"count": {"$sum": 1}}
+            }}],
+            "inStock": _count_by("inStock"),
+            "isNew": _count_by("isNew"),
+            "isFeatured": _count_by("isFeatured")
+        }}
+    ]
+
+def _format_price_buckets(buckets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    counts = {bucket["_id"]: bucket["count"] for bucket in buckets}
+    formatted = []
+    for index, lower in enumerate(PRICE_BUCKETS):
+        upper = PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None
+        count = counts.get(lower, 0)
+        if count:
+            formatted.append({"min": lower, "max": upper, "count": count})
+    return formatted
+
+def _price_bucket(price: Any) -> Any:
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or price < PRICE_BUCKETS[0]:
+        return _OPEN_BUCKET
+    return PRICE_BUCKETS[bisect.bisect_right(PRICE_BUCKETS, price) - 1]
+
+def _counts(buckets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{"value": bucket["_id"], "count": bucket["count"]} for bucket in buckets if bucket["_id"] is not None]
+
+def _format_facets(facet_result: Dict[str, Any]) -> Dict[str, Any]:
+    total_result = facet_result.get("total", [])
+    return {
+        "total": total_result[0]["count"] if total_result else 0,
+        "facets": {
+            "categoryId": _counts(facet_result.get("categoryId", [])),
+            "sellerId": _counts(facet_result.get("sellerId", [])),
+            "price": _format_price_buckets(facet_result.get("price", [])),
+            "inStock": _counts(facet_result.get("inStock", [])),
+            "isNew": _counts(facet_result.get("isNew", [])),
+            "isFeatured": _counts(facet_result.get("isFeatured", []))
+        }
+    }
+
+async def get_facet_counts(collection, filter_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Total and sidebar counts of the products matching a filter"""
+    results = await collection.aggregate(_build_pipeline(filter_dict)).to_list(1)
+    return _format_facets(results[0] if results else {})
+
+def count_facets(documents: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Same result as `get_facet_counts`, computed from documents in memory.
+
+    Used for free-text searches: the search index already holds the facet
+    fields of every match, so no `$in` over the matching ids is sent.
+    """
+    counters: Dict[str, Counter] = {field: Counter() for field in COUNTED_FIELDS}
+    prices: Counter = Counter()
+    total = 0
+    for document in documents:
+        total += 1
+        for field in COUNTED_FIELDS:
+            counters[field][document.get(field)] += 1
+        prices[_price_bucket(document.get("price"))] += 1
+
+    def buckets(counter: Counter) -> List[Dict[str, Any]]:
+        ordered = sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))
+        return [{"_id": value, "count": count} for value, count in ordered]
+
+    return _format_facets({
+        "total": [{"count": total}] if total else [],
+        "price": buckets(prices),
+        **{field: buckets(counter) for field, counter in counters.items()}
+    })
+
+async def get_facet_page(
+    collection,
+    filter_dict: Dict[str, Any],
+    page: int,
+    limit: int,
+    ranked_ids: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Fetch one page of the faceted listing.
+
+    When `ranked_ids` is given (a free-text search, already filtered), only
+    that page's ids are fetched and they keep their relevance order.
+    """
+    skip = (page - 1) * limit
+    if ranked_ids is None:
+        cursor = collection.find(filter_dict, FACET_ITEM_PROJECTION).sort([("createdAt", -1), ("id", -1)]).skip(skip).limit(limit)
+        return await cursor.to_list(limit)
+
+    page_ids = ranked_ids[skip:skip + limit]
+    if not page_ids:
+        return []
+    documents = await collection.find({"id": {"$in": page_ids}}, FACET_ITEM_PROJECTION).to_list(len(page_ids))
+    by_id = {document["id"]: document for document in documents}
+    return [by_id[product_id] for product_id in page_ids if product_id in by_id]
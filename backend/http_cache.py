@@ -0,0 +1,66 @@
+"""
+Conditional GET support for detail endpoints.
+
+ETags come from a document's `updatedAt` when it has one, so revalidating
+an unchanged resource costs a two-field lookup by `id` instead of a full
+fetch and serialization. Documents without `updatedAt` fall back to a hash
+of their content, which needs the full document; startup backfills
+`updatedAt` on categories, sellers and products so that path stays rare.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Response
+
+VERSION_PROJECTION = {"_id": 0, "id": 1, "updatedAt": 1}
+
+def _digest(value: str) -> str:
+    return '"' + hashlib.sha1(value.encode("utf-8")).hexdigest()[:20] + '"'
+
+def document_etag(document: Dict[str, Any]) -> str:
+    """ETag for a stored document"""
+    updated_at = document.get("updatedAt")
+    if updated_at is not None:
+        return _digest(f"{document.get('id')}:{updated_at.isoformat()}")
+    content = {key: value for key, value in document.items() if key != "_id"}
+    return _digest(json.dumps(content, sort_keys=True, default=str))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+async def fetch_with_etag(collection, filter_dict: Dict[str, Any], if_none_match: Optional[str], projection: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str], bool]:
+    """Fetch a document unless the client's copy is current.
+
+    Returns (document, etag, is_not_modified). The document is None when
+    it does not exist or when the client's copy is current.
+    """
+    if if_none_match:
+        version = await collection.find_one(filter_dict, VERSION_PROJECTION)
+        if version is None:
+            return None, None, False
+        if version.get("updatedAt") is not None:
+            etag = document_etag(version)
+            if etag_matches(if_none_match, etag):
+                return None, etag, True
+
+    document = await collection.find_one(filter_dict, projection)
+    if document is None:
+        return None, None, False
+    etag = document_etag(document)
+    if etag_matches(if_none_match, etag):
+        return None, etag, True
+    return document, etag, False
@@ -0,0 +1,185 @@
+"""
+Index registry for every collection the API queries.
+
+`ensure_indexes` is applied on startup and is idempotent: MongoDB skips
+indexes that already exist with the same spec. Run this module directly to
+apply the registry or report missing and unused indexes:
+
+    python indexes.py apply
+    python indexes.py report
+"""
+import argparse
+import asyncio
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+def _unique_id():
+    return IndexModel([("id", ASCENDING)], name="id_unique", unique=True)
+
+# collection name -> indexes; compound keys follow each route's filter + sort
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "products": [
+        _unique_id(),
+        IndexModel([("createdAt", DESCENDING), ("id", DESCENDING)], name="createdAt_id"),
+        IndexModel([("categoryId", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)], name="categoryId_createdAt_id"),
+        IndexModel([("sellerId", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)], name="sellerId_createdAt_id"),
+        IndexModel([("isFeatured", ASCENDING), ("createdAt", DESCENDING)], name="isFeatured_createdAt"),
+        IndexModel([("isNew", ASCENDING), ("createdAt", DESCENDING)], name="isNew_createdAt"),
+        IndexModel([("rating", DESCENDING)], name="rating"),
+        IndexModel([("stockQuantity", ASCENDING)], name="stockQuantity"),
+        IndexModel([("updatedAt", ASCENDING), ("id", ASCENDING)], name="updatedAt_id"),
+    ],
+    "categories": [
+        _unique_id(),
+        IndexModel([("isActive", ASCENDING)], name="isActive"),
+    ],
+    "sellers": [
+        _unique_id(),
+        IndexModel([("rating", DESCENDING)], name="rating"),
+    ],
+    "reviews": [
+        _unique_id(),
+        IndexModel([("productId", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], name="productId_date_id"),
+        IndexModel([("productId", ASCENDING), ("helpful", DESCENDING), ("id", DESCENDING)], name="productId_helpful_id"),
+        IndexModel([("productId", ASCENDING), ("rating", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], name="productId_rating_date_id"),
+    ],
+    "trending_scores": [
+        IndexModel([("productId", ASCENDING)], name="productId_unique", unique=True),
+        IndexModel([("logScore", DESCENDING)], name="logScore"),
+    ],
+    "admin_users": [
+        _unique_id(),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "orders": [
+        _unique_id(),
+        IndexModel([("order_number", ASCENDING)], name="order_number_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at_id"),
+    ],
+    "order_rollups": [
+        IndexModel([("day", ASCENDING), ("seller_id", ASCENDING), ("status", ASCENDING)], name="day_seller_id_status_unique", unique=True),
+    ],
+    "product_sales_rollups": [
+        IndexModel([("day", ASCENDING), ("product_id", ASCENDING), ("status", ASCENDING)], name="day_product_id_status_unique", unique=True),
+    ],
+    "notifications": [
+        _unique_id(),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("is_read", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="is_read_created_at_id"),
+    ],
+    "chart_of_accounts": [
+        _unique_id(),
+        IndexModel([("account_code", ASCENDING)], name="account_code_unique", unique=True),
+        IndexModel([("is_active", ASCENDING), ("account_code", ASCENDING)], name="is_active_account_code"),
+        IndexModel([("account_type", ASCENDING), ("is_active", ASCENDING)], name="account_type_is_active"),
+    ],
+    "customers": [
+        _unique_id(),
+        IndexModel([("customer_code", ASCENDING)], name="customer_code_unique", unique=True),
+        IndexModel([("is_active", ASCENDING), ("customer_name", ASCENDING), ("id", ASCENDING)], name="is_active_customer_name_id"),
+    ],
+    "suppliers": [
+        _unique_id(),
+        IndexModel([("supplier_code", ASCENDING)], name="supplier_code_unique", unique=True),
+        IndexModel([("is_active", ASCENDING), ("supplier_name", ASCENDING), ("id", ASCENDING)], name="is_active_supplier_name_id"),
+    ],
+    "accounting_products": [
+        _unique_id(),
+        IndexModel([("product_code", ASCENDING)], name="product_code_unique", unique=True),
+        IndexModel([("is_active", ASCENDING), ("product_name", ASCENDING), ("id", ASCENDING)], name="is_active_product_name_id"),
+    ],
+    "journal_entries": [
+        _unique_id(),
+        IndexModel([("entry_number", ASCENDING)], name="entry_number_unique", unique=True),
+        IndexModel([("entry_date", DESCENDING), ("id", DESCENDING)], name="entry_date_id"),
+        IndexModel([("status", ASCENDING), ("entry_date", DESCENDING), ("id", DESCENDING)], name="status_entry_date_id"),
+    ],
+    "journal_entry_details": [
+        IndexModel([("journal_entry_id", ASCENDING), ("line_number", ASCENDING)], name="journal_entry_id_line_number"),
+        IndexModel([("account_id", ASCENDING)], name="account_id"),
+    ],
+    "sales_invoices": [
+        _unique_id(),
+        IndexModel([("invoice_number", ASCENDING)], name="invoice_number_unique", unique=True),
+        IndexModel([("invoice_date", DESCENDING), ("id", DESCENDING)], name="invoice_date_id"),
+    ],
+    "sales_invoice_details": [
+        IndexModel([("invoice_id", ASCENDING)], name="invoice_id"),
+    ],
+    "purchase_invoices": [
+        _unique_id(),
+    ],
+    "purchase_invoice_details": [
+        IndexModel([("invoice_id", ASCENDING)], name="invoice_id"),
+    ],
+    "payment_vouchers": [
+        _unique_id(),
+    ],
+    "receipt_vouchers": [
+        _unique_id(),
+    ],
+}
+
+async def ensure_indexes(db):
+    """Create every registered index; failures are logged, not raised"""
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        for index in indexes:
+            try:
+                await db[collection_name].create_indexes([index])
+            except OperationFailure as e:
+                # Typically duplicate keys in existing data or a spec conflict
+                logger.error(f"Could not create index {collection_name}.{index.document['name']}: {e}")
+
+async def index_report(db):
+    """Compare the registry with the indexes present and their usage.
+
+    Returns a list of dicts describing missing, unused and unregistered
+    indexes. Usage counts come from `$indexStats` and reset on restart.
+    """
+    report = []
+    existing_collections = set(await db.list_collection_names())
+    for collection_name in sorted(set(INDEX_REGISTRY) | existing_collections):
+        if collection_name.startswith("system."):
+            continue
+        registered = {index.document["name"] for index in INDEX_REGISTRY.get(collection_name, [])}
+        usage = {}
+        if collection_name in existing_collections:
+            stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+            usage = {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+
+        for name in sorted(registered - set(usage)):
+            report.append({"collection": collection_name, "index": name, "status": "missing"})
+        for name, ops in sorted(usage.items()):
+            if name == "_id_":
+                continue
+            if name not in registered:
+                report.append({"collection": collection_name, "index": name, "status": "unregistered", "ops": ops})
+            elif ops == 0:
+                report.append({"collection": collection_name, "index": name, "status": "unused", "ops": ops})
+    return report
+
+async def main(command: str):
+    from database import client, db
+
+    if command == "apply":
+        await ensure_indexes(db)
+        print("✅ Indexes applied")
+    else:
+        report = await index_report(db)
+        if not report:
+            print("✅ All registered indexes exist and are in use")
+        for entry in report:
+            ops = f" ({entry['ops']} ops)" if "ops" in entry else ""
+            print(f"{entry['status']:<13} {entry['collection']}.{entry['index']}{ops}")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "report"])
+    asyncio.run(main(parser.parse_args().command))
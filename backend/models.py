@@ -10,6 +10,7 @@ class CategoryModel(BaseModel):
     icon: str
     subCategories: List[str] = []
     createdAt: datetime = Field(default_factory=datetime.utcnow)
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
     isActive: bool = True
 
 class CategoryCreate(BaseModel):
@@ -85,6 +86,7 @@ class SellerModel(BaseModel):
     isVerified: bool = False
     policies: SellerPolicy
     createdAt: datetime = Field(default_factory=datetime.utcnow)
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
 class SellerCreate(BaseModel):
     name: str
@@ -136,6 +138,9 @@ class ProductFilter(BaseModel):
     isFeatured: Optional[bool] = None
     search: Optional[str] = None
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=200)
+
 class PaginationParams(BaseModel):
     page: int = Field(default=1, ge=1)
     limit: int = Field(default=12, ge=1, le=100)
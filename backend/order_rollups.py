@@ -0,0 +1,176 @@
+"""
+Daily order rollups.
+
+`order_rollups` holds one small document per (local day, seller, status)
+with the order count, revenue, tax, discount and units sold of the orders
+in that bucket. `product_sales_rollups` does the same per (local day,
+product, status) from the order line items, with units sold and revenue.
+Order writes move an order between buckets with `$inc`, so dashboards,
+charts and product rankings read a few rollup documents instead of
+scanning `orders`.
+
+Days are calendar days in the reporting timezone. After changing the
+timezone, or to repair drift, rebuild from the raw orders:
+
+    python order_rollups.py backfill
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from pymongo import UpdateOne
+
+from db_provider import db
+
+rollups_collection = db.order_rollups
+product_rollups_collection = db.product_sales_rollups
+orders_collection = db.orders
+
+DAY_FORMAT = "%Y-%m-%d"
+MEASURES = ("orders", "revenue", "tax", "discount", "items_sold")
+
+def local_day(moment: datetime, tz_name: str) -> str:
+    """Calendar day of a naive UTC datetime in the given timezone"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name)).strftime(DAY_FORMAT)
+
+def _bucket_key(order: Dict[str, Any], tz_name: str) -> Dict[str, Any]:
+    return {
+        "day": local_day(order["created_at"], tz_name),
+        "seller_id": order.get("seller_id"),
+        "status": order.get("status", "pending")
+    }
+
+def _measures(order: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "orders": 1,
+        "revenue": order.get("total", 0.0),
+        "tax": order.get("tax", 0.0),
+        "discount": order.get("discount", 0.0),
+        "items_sold": sum(item.get("quantity", 0) for item in order.get("items", []))
+    }
+
+def _product_updates(order: Dict[str, Any], tz_name: str, sign: int) -> List[UpdateOne]:
+    key = _bucket_key(order, tz_name)
+    sold: Dict[str, Dict[str, Any]] = {}
+    for item in order.get("items", []):
+        line = sold.setdefault(item["product_id"], {"units": 0, "revenue": 0.0, "item": item})
+        line["units"] += item.get("quantity", 0)
+        line["revenue"] += item.get("total", 0.0)
+    
+    updates = []
+    for product_id, line in sold.items():
+        update = {"$inc": {"units": sign * line["units"], "revenue": sign * line["revenue"]}}
+        if sign > 0:
+            update["$set"] = {"product_title": line["item"].get("product_title", ""), "product_image": line["item"].get("product_image", "")}
+        updates.append(UpdateOne({"day": key["day"], "product_id": product_id, "status": key["status"]}, update, upsert=True))
+    return updates
+
+async def apply_order_change(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]], tz_name: str):
+    """Move an order's contribution from its old bucket to its new one.
+
+    Pass `before=None` for a new order and `after=None` for a removed one.
+    """
+    deltas: List[tuple] = []
+    if before is not None:
+        deltas.append((_bucket_key(before, tz_name), _measures(before), -1))
+    if after is not None:
+        deltas.append((_bucket_key(after, tz_name), _measures(after), 1))
+    if len(deltas) == 2 and deltas[0][:2] == deltas[1][:2]:
+        return
+
+    await rollups_collection.bulk_write(
+        [
+            UpdateOne(key, {"$inc": {name: sign * value for name, value in measures.items()}}, upsert=True)
+            for key, measures, sign in deltas
+        ],
+        ordered=False
+    )
+    
+    product_updates = []
+    if before is not None:
+        product_updates.extend(_product_updates(before, tz_name, -1))
+    if after is not None:
+        product_updates.extend(_product_updates(after, tz_name, 1))
+    if product_updates:
+        await product_rollups_collection.bulk_write(product_updates, ordered=False)
+
+async def backfill(tz_name: str):
+    """Rebuild every rollup from the orders collection.
+
+    The group and sort stages may spill to disk, which large order
+    collections need on servers older than MongoDB 6.0.
+    """
+    await orders_collection.aggregate([
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at", "timezone": tz_name}},
+                "seller_id": "$seller_id",
+                "status": "$status"
+            },
+            "orders": {"$sum": 1},
+            "revenue": {"$sum": "$total"},
+            "tax": {"$sum": {"$ifNull": ["$tax", 0]}},
+            "discount": {"$sum": {"$ifNull": ["$discount", 0]}},
+            "items_sold": {"$sum": {"$sum": "$items.quantity"}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "seller_id": "$_id.seller_id",
+            "status": "$_id.status",
+            **{name: 1 for name in MEASURES}
+        }},
+        {"$out": rollups_collection.name}
+    ], allowDiskUse=True).to_list(None)
+    
+    await orders_collection.aggregate([
+        {"$unwind": "$items"},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at", "timezone": tz_name}},
+                "product_id": "$items.product_id",
+                "status": "$status"
+            },
+            "units": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.total"},
+            "product_title": {"$last": "$items.product_title"},
+            "product_image": {"$last": "$items.product_image"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "product_id": "$_id.product_id",
+            "status": "$_id.status",
+            "units": 1,
+            "revenue": 1,
+            "product_title": 1,
+            "product_image": 1
+        }},
+        {"$out": product_rollups_collection.name}
+    ], allowDiskUse=True).to_list(None)
+
+async def ensure_rollups(tz_name: str):
+    """Backfill once when orders exist but no rollups were built yet"""
+    if await orders_collection.find_one({}, {"_id": 1}) is None:
+        return
+    for collection in (rollups_collection, product_rollups_collection):
+        if await collection.find_one({}, {"_id": 1}) is None:
+            await backfill(tz_name)
+            return
+
+async def main():
+    from analytics import get_reporting_timezone, rebuild_order_rollups
+    from db_provider import client
+
+    await rebuild_order_rollups()
+    print(f"✅ Order rollups rebuilt ({await get_reporting_timezone()})")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage daily order rollups")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow, so hashing and checking run on a small
+dedicated thread pool instead of blocking every request on the worker.
+The pool is bounded: when `PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE`
+operations are already in flight, new ones fail fast with
+`PasswordHasherBusy` instead of queueing without limit. Each operation also
+gives up after `PASSWORD_HASH_TIMEOUT_SECONDS`.
+
+`BCRYPT_ROUNDS` sets the cost factor for new hashes; `needs_rehash` tells
+whether a stored hash was made with a different cost.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import bcrypt
+
+T = TypeVar("T")
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '32'))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', '5'))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_in_flight = 0
+
+class PasswordHasherBusy(Exception):
+    """The hashing pool is saturated or an operation timed out"""
+
+def _release(_future):
+    global _in_flight
+    _in_flight -= 1
+
+async def _run(func: Callable[..., T], *args) -> T:
+    global _in_flight
+    if _in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise PasswordHasherBusy("Too many password operations in progress")
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, func, *args)
+    # The slot is freed when the work really ends, even after a timeout
+    _in_flight += 1
+    future.add_done_callback(_release)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise PasswordHasherBusy("Password operation timed out")
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def _check(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+async def hash_password(password: str) -> str:
+    """Hash a password with the configured cost factor"""
+    return await _run(_hash, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Check a password against a stored bcrypt hash"""
+    return await _run(_check, password, hashed)
+
+def needs_rehash(hashed: str) -> bool:
+    """Whether a stored hash uses a cost factor other than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def shutdown():
+    _executor.shutdown(wait=False)
@@ -0,0 +1,165 @@
+"""
+Product rating counters maintained on review writes.
+
+Each product carries `ratingStats` with the running sum of ratings, the
+number of reviews, a per-star histogram and the number of verified-purchase
+reviews. A review write adjusts those counters and re-derives
+`rating`/`reviewCount` from them in one atomic update, so its cost no
+longer depends on how many reviews the product has.
+
+Products written before the counters existed (or before the verified
+counter was added) get them from the reviews collection once, on their
+next review write or summary read.
+
+That baseline must not overlap with increments. A new review is therefore
+stored with `ratingCounted: false` and flagged true only after its
+increment has landed. The baseline counts only flagged (or older,
+unflagged) reviews, and it is installed only if no other request installed
+counters first. The write that triggered it then retries its own
+increment.
+
+Deletes follow the flag too: a review deleted while still unflagged is
+left to `add_review_rating`, whose conditional flag update then finds
+nothing and reverses the increment. Whichever order the writes land in,
+each review is counted exactly once.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from database import products_collection, reviews_collection
+
+STARS = ("1", "2", "3", "4", "5")
+
+# Set to False on insert and to True once the review is in its product's counters
+COUNTED_FIELD = "ratingCounted"
+
+def _plus(path: str, delta: int) -> Dict[str, Any]:
+    return {"$add": [{"$ifNull": [f"${path}", 0]}, delta]}
+
+def _derived_fields(now: datetime) -> Dict[str, Any]:
+    count = "$ratingStats.count"
+    return {
+        "rating": {"$cond": [
+            {"$gt": [count, 0]},
+            {"$round": [{"$divide": ["$ratingStats.sum", count]}, 1]},
+            0
+        ]},
+        "reviewCount": count,
+        "updatedAt": now
+    }
+
+def _counter_pipeline(rating: int, verified: bool, direction: int):
+    """Update pipeline equivalent to `$inc` on the counters followed by
+    recomputing the derived fields from the new values."""
+    return [
+        {"$set": {
+            "ratingStats.sum": _plus("ratingStats.sum", rating * direction),
+            "ratingStats.count": _plus("ratingStats.count", direction),
+            f"ratingStats.stars.{rating}": _plus(f"ratingStats.stars.{rating}", direction),
+            "ratingStats.verified": _plus("ratingStats.verified", direction if verified else 0)
+        }},
+        {"$set": _derived_fields(datetime.utcnow())}
+    ]
+
+def _review_stats(stars: Dict[str, int], verified: int) -> Dict[str, Any]:
+    return {
+        "sum": sum(int(star) * value for star, value in stars.items()),
+        "count": sum(stars.values()),
+        "stars": stars,
+        "verified": verified
+    }
+
+async def _install_baseline(product_id: str, deleted_review: Optional[Dict[str, Any]] = None):
+    """Install counters computed from already counted reviews, unless present.
+
+    A review that was just deleted, and had been counted, is added back, so
+    the caller's decrement then takes it out again.
+    """
+    stars = {star: 0 for star in STARS}
+    verified = 0
+    async for bucket in reviews_collection.aggregate([
+        {"$match": {"productId": product_id, COUNTED_FIELD: {"$ne": False}}},
+        {"$group": {
+            "_id": "$rating",
+            "count": {"$sum": 1},
+            "verified": {"$sum": {"$cond": [{"$eq": ["$verified", True]}, 1, 0]}}
+        }}
+    ]):
+        stars[str(bucket["_id"])] = bucket["count"]
+        verified += bucket["verified"]
+    if deleted_review is not None:
+        stars[str(deleted_review["rating"])] += 1
+        verified += 1 if deleted_review.get("verified") else 0
+
+    stats = _review_stats(stars, verified)
+    await products_collection.update_one(
+        {"id": product_id, "ratingStats.verified": {"$exists": False}},
+        {"$set": {
+            "ratingStats": stats,
+            "rating": round(stats["sum"] / stats["count"], 1) if stats["count"] else 0,
+            "reviewCount": stats["count"],
+            "updatedAt": datetime.utcnow()
+        }}
+    )
+
+async def _apply(product_id: str, review: Dict[str, Any], direction: int) -> bool:
+    pipeline = _counter_pipeline(review["rating"], review.get("verified", False), direction)
+    for attempt in range(2):
+        result = await products_collection.update_one(
+            {"id": product_id, "ratingStats.verified": {"$exists": True}},
+            pipeline
+        )
+        if result.matched_count:
+            return True
+        if attempt == 0:
+            await _install_baseline(product_id, review if direction < 0 else None)
+    # The product no longer exists
+    return False
+
+async def add_review_rating(product_id: str, review: Dict[str, Any]):
+    """Count a newly stored review (inserted with ratingCounted false) in its product's rating"""
+    if not await _apply(product_id, review, 1):
+        return
+    flagged = await reviews_collection.update_one(
+        {"id": review["id"], COUNTED_FIELD: False},
+        {"$set": {COUNTED_FIELD: True}}
+    )
+    if not flagged.matched_count:
+        # Deleted before the flag was set, so the delete skipped its
+        # decrement; take the increment back here instead
+        await _apply(product_id, review, -1)
+
+async def remove_review_rating(product_id: str, review: Dict[str, Any]):
+    """Take a deleted review out of its product's rating"""
+    if review.get(COUNTED_FIELD) is False:
+        # add_review_rating has not flagged it yet and undoes its own increment
+        return
+    await _apply(product_id, review, -1)
+
+async def get_rating_summary(product_id: str) -> Optional[Dict[str, Any]]:
+    """Star histogram, average and verified share of a product's reviews.
+
+    Returns None when the product does not exist.
+    """
+    product = await products_collection.find_one({"id": product_id}, {"_id": 0, "ratingStats": 1})
+    if product is None:
+        return None
+    stats = product.get("ratingStats")
+    if not stats or "verified" not in stats:
+        await _install_baseline(product_id)
+        product = await products_collection.find_one({"id": product_id}, {"_id": 0, "ratingStats": 1})
+        if product is None:
+            return None
+        stats = product["ratingStats"]
+
+    count = stats["count"]
+    stars = {star: stats.get("stars", {}).get(star, 0) for star in STARS}
+    return {
+        "productId": product_id,
+        "average": round(stats["sum"] / count, 2) if count else 0,
+        "count": count,
+        "histogram": stars,
+        "percentages": {star: round(100 * value / count, 1) if count else 0 for star, value in stars.items()},
+        "verifiedCount": stats["verified"],
+        "verifiedShare": round(stats["verified"] / count, 3) if count else 0
+    }
@@ -15,14 +15,10 @@ from models_accounting import (
     JournalEntryStatus
 )
 from models_admin import AdminUser  # للمصادقة
-from database import get_paginated_results
+from database import get_paginated_results, invalidate_counts
 from routes.admin import verify_admin_token
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
-
-# Database connection
-client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-db = client[os.environ.get('DB_NAME', 'souq_express_db')]
+from serialization import convert_objectid
+from db_provider import db
 
 # Collections
 chart_of_accounts_collection = db.chart_of_accounts
@@ -40,17 +36,6 @@ receipt_vouchers_collection = db.receipt_vouchers
 
 router = APIRouter(prefix="/accounting", tags=["accounting"])
 
-def convert_objectid(data):
-    """Convert MongoDB ObjectId to string recursively"""
-    if isinstance(data, dict):
-        if "_id" in data:
-            data.pop("_id", None)
-        return {key: convert_objectid(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectid(item) for item in data]
-    else:
-        return data
-
 # Chart of Accounts Routes
 @router.get("/chart-of-accounts", response_model=List[ChartOfAccount])
 async def get_chart_of_accounts(current_admin = Depends(verify_admin_token)):
@@ -92,10 +77,12 @@ async def get_chart_of_account(account_id: str, current_admin = Depends(verify_a
 async def get_customers(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     current_admin = Depends(verify_admin_token)
 ):
     """Get all customers"""
-    result = await get_paginated_results(customers_collection, {"is_active": True}, page, limit, "customer_name", 1)
+    result = await get_paginated_results(customers_collection, {"is_active": True}, page, limit, "customer_name", 1, cursor=cursor, with_total=withTotal)
     result["items"] = convert_objectid(result["items"])
     return result
 
@@ -111,6 +98,7 @@ async def create_customer(customer: CustomerCreate, current_admin = Depends(veri
     customer_dict = customer.dict()
     customer_obj = Customer(**customer_dict)
     await customers_collection.insert_one(customer_obj.dict())
+    invalidate_counts(customers_collection)
     
     return customer_obj
 
@@ -129,10 +117,12 @@ async def get_customer(customer_id: str, current_admin = Depends(verify_admin_to
 async def get_suppliers(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     current_admin = Depends(verify_admin_token)
 ):
     """Get all suppliers"""
-    result = await get_paginated_results(suppliers_collection, {"is_active": True}, page, limit, "supplier_name", 1)
+    result = await get_paginated_results(suppliers_collection, {"is_active": True}, page, limit, "supplier_name", 1, cursor=cursor, with_total=withTotal)
     result["items"] = convert_objectid(result["items"])
     return result
 
@@ -148,6 +138,7 @@ async def create_supplier(supplier: SupplierCreate, current_admin = Depends(veri
     supplier_dict = supplier.dict()
     supplier_obj = Supplier(**supplier_dict)
     await suppliers_collection.insert_one(supplier_obj.dict())
+    invalidate_counts(suppliers_collection)
     
     return supplier_obj
 
@@ -156,10 +147,12 @@ async def create_supplier(supplier: SupplierCreate, current_admin = Depends(veri
 async def get_accounting_products(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     current_admin = Depends(verify_admin_token)
 ):
     """Get all accounting products"""
-    result = await get_paginated_results(products_collection, {"is_active": True}, page, limit, "product_name", 1)
+    result = await get_paginated_results(products_collection, {"is_active": True}, page, limit, "product_name", 1, cursor=cursor, with_total=withTotal)
     result["items"] = convert_objectid(result["items"])
     return result
 
@@ -175,6 +168,7 @@ async def create_accounting_product(product: ProductCreate, current_admin = Depe
     product_dict = product.dict()
     product_obj = Product(**product_dict)
     await products_collection.insert_one(product_obj.dict())
+    invalidate_counts(products_collection)
     
     return product_obj
 
@@ -183,6 +177,8 @@ async def create_accounting_product(product: ProductCreate, current_admin = Depe
 async def get_journal_entries(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     status: Optional[str] = None,
     current_admin = Depends(verify_admin_token)
 ):
@@ -191,7 +187,7 @@ async def get_journal_entries(
     if status:
         filter_dict["status"] = status
     
-    result = await get_paginated_results(journal_entries_collection, filter_dict, page, limit, "entry_date", -1)
+    result = await get_paginated_results(journal_entries_collection, filter_dict, page, limit, "entry_date", -1, cursor=cursor, with_total=withTotal)
     result["items"] = convert_objectid(result["items"])
     return result
 
@@ -220,6 +216,7 @@ async def create_journal_entry(entry: JournalEntryCreate, current_admin = Depend
     
     entry_obj = JournalEntry(**entry_dict)
     await journal_entries_collection.insert_one(entry_obj.dict())
+    invalidate_counts(journal_entries_collection)
     
     # Create journal entry details
     for i, detail in enumerate(entry.details, 1):
@@ -308,6 +305,7 @@ async def post_journal_entry(entry_id: str, current_admin = Depends(verify_admin
             }
         }
     )
+    invalidate_counts(journal_entries_collection)
     
     return {"message": "تم ترحيل القيد بنجاح"}
 
@@ -316,10 +314,12 @@ async def post_journal_entry(entry_id: str, current_admin = Depends(verify_admin
 async def get_sales_invoices(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     current_admin = Depends(verify_admin_token)
 ):
     """Get all sales invoices"""
-    result = await get_paginated_results(sales_invoices_collection, {}, page, limit, "invoice_date", -1)
+    result = await get_paginated_results(sales_invoices_collection, {}, page, limit, "invoice_date", -1, cursor=cursor, with_total=withTotal)
     result["items"] = convert_objectid(result["items"])
     return result
 
@@ -352,6 +352,7 @@ async def create_sales_invoice(invoice: SalesInvoiceCreate, current_admin = Depe
     
     invoice_obj = SalesInvoice(**invoice_dict)
     await sales_invoices_collection.insert_one(invoice_obj.dict())
+    invalidate_counts(sales_invoices_collection)
     
     # Create invoice details
     for detail in invoice.details:
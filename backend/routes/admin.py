@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import os
+import uuid
 import jwt
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-import bcrypt
 from models_admin import (
     AdminUser, AdminUserCreate, AdminLogin, AdminChangePassword, AdminToken,
     Order, OrderCreate, OrderUpdate, 
@@ -14,14 +17,24 @@ from models_admin import (
 )
 from database import (
     categories_collection, products_collection, sellers_collection, 
-    reviews_collection, get_paginated_results
+    reviews_collection, get_paginated_results, invalidate_counts,
+    encode_cursor, decode_cursor
+)
+from routes.products import resolve_product_projection, invalidate_product_caches
+from search import product_search_index
+from trending import record_order, TRENDING_ORDER_STATUSES
+from catalog_io import ImportFileError, build_export_filter, export_products, export_watermark, import_products
+from serialization import JSONBytesResponse, convert_objectid
+from pymongo import ReturnDocument
+from db_provider import db
+from cache import TTLCache
+import passwords
+from analytics import (
+    DEFAULT_TIMEZONE, dashboard_cache, settings_cache, order_write_lock, get_dashboard_snapshot,
+    get_sales_series, get_top_products, record_order_change, schedule_rollup_rebuild
 )
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 
 # Admin collections
-client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-db = client[os.environ.get('DB_NAME', 'test_database')]
 admin_users_collection = db.admin_users
 orders_collection = db.orders
 settings_collection = db.settings
@@ -35,30 +48,33 @@ JWT_SECRET = "your-super-secret-jwt-key-change-in-production"
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_HOURS = 24
 
-def convert_objectid(data):
-    """Convert MongoDB ObjectId to string recursively"""
-    if isinstance(data, dict):
-        if "_id" in data:
-            data.pop("_id", None)
-        return {key: convert_objectid(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectid(item) for item in data]
-    else:
-        return data
+# Resolved admins by (username, token id), so authenticated requests skip the lookup
+ADMIN_IDENTITY_CACHE_TTL_SECONDS = float(os.environ.get('ADMIN_IDENTITY_CACHE_TTL_SECONDS', '30'))
+admin_identity_cache = TTLCache(ttl=ADMIN_IDENTITY_CACHE_TTL_SECONDS, max_size=1024)
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def invalidate_admin_identity(username: str):
+    """Forget cached identities of an admin, e.g. after a password change or deactivation"""
+    admin_identity_cache.invalidate_where(lambda key: key[0] == username)
 
-def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def hash_password(password: str) -> str:
+    """Hash password using bcrypt, off the event loop"""
+    try:
+        return await passwords.hash_password(password)
+    except passwords.PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again")
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Verify password against hash, off the event loop"""
+    try:
+        return await passwords.verify_password(password, hashed)
+    except passwords.PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again")
 
 def create_access_token(data: dict):
     """Create JWT access token"""
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRE_HOURS)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 async def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -70,11 +86,20 @@ async def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        admin = await admin_users_collection.find_one({"username": username, "is_active": True})
+        # Tokens issued before token ids were added fall back to their expiry
+        cache_key = (username, payload.get("jti") or payload.get("exp"))
+        admin = admin_identity_cache.get(cache_key)
         if admin is None:
-            raise HTTPException(status_code=401, detail="Admin user not found")
+            admin = await admin_users_collection.find_one(
+                {"username": username, "is_active": True},
+                {"_id": 0, "password_hash": 0}
+            )
+            if admin is None:
+                raise HTTPException(status_code=401, detail="Admin user not found")
+            admin_identity_cache.set(cache_key, admin)
         
-        return convert_objectid(admin)
+        # Handlers may modify what they get
+        return dict(admin)
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except InvalidTokenError:
@@ -89,7 +114,7 @@ async def init_default_admin():
             "id": "admin-001",
             "username": "admin",
             "email": "admin@bazari.com",
-            "password_hash": hash_password("admin123"),
+            "password_hash": await hash_password("admin123"),
             "full_name": "مدير المنصة",
             "role": "super_admin",
             "is_active": True,
@@ -103,13 +128,20 @@ async def init_default_admin():
 async def admin_login(login_data: AdminLogin):
     """Admin login"""
     admin = await admin_users_collection.find_one({"username": login_data.username, "is_active": True})
-    if not admin or not verify_password(login_data.password, admin["password_hash"]):
+    if not admin or not await verify_password(login_data.password, admin["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Update last login
+    # Update last login, upgrading the hash if it was made with another cost factor
+    login_update = {"last_login": datetime.utcnow()}
+    if passwords.needs_rehash(admin["password_hash"]):
+        try:
+            login_update["password_hash"] = await passwords.hash_password(login_data.password)
+        except passwords.PasswordHasherBusy:
+            # Best effort: the password is verified, upgrade on a later login
+            pass
     await admin_users_collection.update_one(
         {"id": admin["id"]},
-        {"$set": {"last_login": datetime.utcnow()}}
+        {"$set": login_update}
     )
     
     # Create token
@@ -138,7 +170,7 @@ async def change_admin_password(
     
     # Verify current password
     admin = await admin_users_collection.find_one({"username": current_admin["username"]})
-    if not admin or not verify_password(password_data.current_password, admin["password_hash"]):
+    if not admin or not await verify_password(password_data.current_password, admin["password_hash"]):
         raise HTTPException(status_code=400, detail="كلمة المرور الحالية غير صحيحة")
     
     # Check if new passwords match
@@ -150,13 +182,14 @@ async def change_admin_password(
         raise HTTPException(status_code=400, detail="كلمة المرور الجديدة يجب أن تكون 6 أحرف على الأقل")
     
     # Hash new password
-    new_password_hash = hash_password(password_data.new_password)
+    new_password_hash = await hash_password(password_data.new_password)
     
     # Update password in database
     await admin_users_collection.update_one(
         {"id": current_admin["id"]},
         {"$set": {"password_hash": new_password_hash}}
     )
+    invalidate_admin_identity(current_admin["username"])
     
     return {"message": "تم تحديث كلمة المرور بنجاح"}
 
@@ -164,96 +197,25 @@ async def change_admin_password(
 @router.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(current_admin = Depends(verify_admin_token)):
     """Get dashboard statistics"""
-    
-    # Calculate stats
-    total_orders = await orders_collection.count_documents({})
-    total_products = await products_collection.count_documents({})
-    total_sellers = await sellers_collection.count_documents({})
-    total_customers = 0  # Will implement with user system
-    
-    # Revenue calculation
-    pipeline = [
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-    ]
-    revenue_result = await orders_collection.aggregate(pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total"] if revenue_result else 0.0
-    
-    # Today's stats
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    orders_today = await orders_collection.count_documents({"created_at": {"$gte": today}})
-    
-    # Today's revenue
-    pipeline_today = [
-        {"$match": {"created_at": {"$gte": today}}},
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-    ]
-    revenue_today_result = await orders_collection.aggregate(pipeline_today).to_list(1)
-    revenue_today = revenue_today_result[0]["total"] if revenue_today_result else 0.0
-    
-    # Pending orders
-    pending_orders = await orders_collection.count_documents({"status": "pending"})
-    
-    # Low stock products (assuming stock < 10)
-    low_stock_products = await products_collection.count_documents({"stockQuantity": {"$lt": 10}})
-    
-    return DashboardStats(
-        total_orders=total_orders,
-        total_revenue=total_revenue,
-        total_customers=total_customers,
-        total_products=total_products,
-        total_sellers=total_sellers,
-        orders_today=orders_today,
-        revenue_today=revenue_today,
-        pending_orders=pending_orders,
-        low_stock_products=low_stock_products
-    )
+    return DashboardStats(**await get_dashboard_snapshot())
 
 @router.get("/analytics", response_model=AnalyticsData)
-async def get_analytics_data(current_admin = Depends(verify_admin_token)):
+async def get_analytics_data(
+    days: int = Query(7, ge=1, le=366),
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    topBy: str = Query("units", pattern="^(units|revenue)$"),
+    current_admin = Depends(verify_admin_token)
+):
     """Get comprehensive analytics data"""
     
-    # Dashboard stats
-    stats = await get_dashboard_stats(current_admin)
-    
-    # Sales chart data (last 7 days)
-    sales_data = []
-    for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date_start + timedelta(days=1)
-        
-        # Daily orders count
-        daily_orders = await orders_collection.count_documents({
-            "created_at": {"$gte": date_start, "$lt": date_end}
-        })
-        
-        # Daily revenue
-        pipeline = [
-            {"$match": {"created_at": {"$gte": date_start, "$lt": date_end}}},
-            {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-        ]
-        revenue_result = await orders_collection.aggregate(pipeline).to_list(1)
-        daily_revenue = revenue_result[0]["total"] if revenue_result else 0.0
-        
-        sales_data.append(SalesData(
-            date=date.strftime("%Y-%m-%d"),
-            sales=daily_revenue,
-            orders=daily_orders
-        ))
-    
-    # Top products (mock data for now)
-    products = await products_collection.find({}).sort("rating", -1).limit(5).to_list(5)
-    products_clean = convert_objectid(products)
-    top_products = [
-        TopProduct(
-            id=product["id"],
-            title=product["title"],
-            image=product["image"],
-            sales_count=50,  # Mock data
-            revenue=product["price"] * 50
-        )
-        for product in products_clean
-    ]
+    # Dashboard stats, sales chart and best sellers over the same window
+    stats, series, best_sellers = await asyncio.gather(
+        get_dashboard_snapshot(),
+        get_sales_series(days, granularity),
+        get_top_products(days, 5, topBy)
+    )
+    sales_data = [SalesData(**bucket) for bucket in series]
+    top_products = [TopProduct(**product) for product in best_sellers]
     
     # Recent orders (mock some orders if none exist)
     recent_orders_data = await orders_collection.find({}).sort("created_at", -1).limit(5).to_list(5)
@@ -276,7 +238,10 @@ async def get_analytics_data(current_admin = Depends(verify_admin_token)):
                 seller_id="1"
             )
             mock_orders.append(mock_order.dict())
-            await orders_collection.insert_one(mock_order.dict())
+            async with order_write_lock:
+                await orders_collection.insert_one(mock_order.dict())
+                await record_order_change(None, mock_order.dict())
+        invalidate_counts(orders_collection)
         recent_orders_data = mock_orders
     else:
         recent_orders_data = convert_objectid(recent_orders_data)
@@ -284,17 +249,38 @@ async def get_analytics_data(current_admin = Depends(verify_admin_token)):
     recent_orders = [Order(**order) for order in recent_orders_data]
     
     return AnalyticsData(
-        dashboard_stats=stats,
+        dashboard_stats=DashboardStats(**stats),
         sales_chart=sales_data,
         top_products=top_products,
         recent_orders=recent_orders
     )
 
+@router.get("/analytics/sales", response_model=List[SalesData])
+async def get_sales_chart(
+    days: int = Query(30, ge=1, le=366),
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    current_admin = Depends(verify_admin_token)
+):
+    """Get revenue and order counts per period, oldest first"""
+    return await get_sales_series(days, granularity)
+
+@router.get("/analytics/top-products", response_model=List[TopProduct])
+async def get_top_selling_products(
+    days: int = Query(30, ge=1, le=366),
+    limit: int = Query(10, ge=1, le=100),
+    by: str = Query("units", pattern="^(units|revenue)$"),
+    current_admin = Depends(verify_admin_token)
+):
+    """Get the best selling products by units or revenue"""
+    return await get_top_products(days, limit, by)
+
 # Orders management
 @router.get("/orders")
 async def get_all_orders(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     status: Optional[str] = None,
     current_admin = Depends(verify_admin_token)
 ):
@@ -303,7 +289,7 @@ async def get_all_orders(
     if status:
         filter_dict["status"] = status
     
-    result = await get_paginated_results(orders_collection, filter_dict, page, limit, "created_at", -1)
+    result = await get_paginated_results(orders_collection, filter_dict, page, limit, "created_at", -1, cursor=cursor, with_total=withTotal)
     result["items"] = convert_objectid(result["items"])
     
     return result
@@ -323,14 +309,24 @@ async def update_order(order_id: str, order_update: OrderUpdate, current_admin =
     update_data = {k: v for k, v in order_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     
-    result = await orders_collection.update_one(
-        {"id": order_id},
-        {"$set": update_data}
-    )
+    async with order_write_lock:
+        previous = await orders_collection.find_one_and_update(
+            {"id": order_id},
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is not None:
+            await record_order_change(previous, {**previous, **update_data})
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    invalidate_counts(orders_collection)
+    
+    new_status = update_data.get("status")
+    if new_status in TRENDING_ORDER_STATUSES and previous.get("status") != new_status:
+        await record_order(previous)
+    
     return {"message": "Order updated successfully"}
 
 # Products management (using existing product endpoints with admin auth)
@@ -338,12 +334,83 @@ async def update_order(order_id: str, order_update: OrderUpdate, current_admin =
 async def admin_get_products(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
+    view: str = Query("full", pattern="^(full|card)$"),
+    fields: Optional[str] = None,
     current_admin = Depends(verify_admin_token)
 ):
     """Get all products for admin"""
-    result = await get_paginated_results(products_collection, {}, page, limit)
-    result["items"] = convert_objectid(result["items"])
-    return result
+    projection = resolve_product_projection(view, fields)
+    result = await get_paginated_results(products_collection, {}, page, limit, cursor=cursor, with_total=withTotal, projection=projection)
+    return JSONBytesResponse(result)
+
+@router.post("/products/import")
+async def admin_import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    current_admin = Depends(verify_admin_token)
+):
+    """Bulk import products from an NDJSON or CSV upload.
+    
+    Rows are upserted by `id` in batches; invalid rows are reported with
+    their line number and do not stop the import. A file that is not UTF-8
+    is rejected before anything is written.
+    """
+    file_format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    
+    def on_written(product_id, product):
+        product_search_index.index_product({**product.dict(), "id": product_id})
+    
+    try:
+        report = await import_products(products_collection, file.file, file_format, on_written)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_product_caches()
+    return report
+
+@router.get("/products/export")
+async def admin_export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    categoryId: Optional[str] = None,
+    sellerId: Optional[str] = None,
+    updatedSince: Optional[datetime] = None,
+    after: Optional[str] = None,
+    current_admin = Depends(verify_admin_token)
+):
+    """Stream the product catalog as NDJSON or CSV.
+    
+    The `X-Export-Watermark` response header holds an opaque token; pass it
+    back as `after` to export only what changed since, for incremental feeds.
+    """
+    position = None
+    if after:
+        try:
+            sort_value, item_id, _ = decode_cursor(after)
+        except ValueError:
+            sort_value = None
+        if not isinstance(sort_value, datetime):
+            raise HTTPException(status_code=400, detail="Invalid export watermark")
+        position = (sort_value, item_id)
+    
+    # Fix the end of the export up front so the header can announce it and
+    # rows updated while streaming are left for the next run
+    until = await export_watermark(products_collection, build_export_filter(categoryId, sellerId, updatedSince, position))
+    if until is None and position is not None:
+        # Nothing new: bounding on (position, position] keeps the export empty
+        until = position
+    filter_dict = build_export_filter(categoryId, sellerId, updatedSince, position, until)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"products-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if until is not None:
+        headers["X-Export-Watermark"] = encode_cursor(until[0], until[1], "next")
+    
+    return StreamingResponse(
+        export_products(products_collection, filter_dict, format),
+        media_type=media_type,
+        headers=headers
+    )
 
 # Categories management
 @router.get("/categories")
@@ -381,11 +448,19 @@ async def update_system_settings(
     update_data = {k: v for k, v in settings_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     
-    await settings_collection.update_one(
+    previous = await settings_collection.find_one_and_update(
         {},
         {"$set": update_data},
-        upsert=True
+        projection={"_id": 0, "timezone": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
     )
+    settings_cache.clear()
+    dashboard_cache.clear()
+    # Rollup days are local calendar days
+    previous_timezone = (previous or {}).get("timezone") or DEFAULT_TIMEZONE
+    if "timezone" in update_data and update_data["timezone"] != previous_timezone:
+        schedule_rollup_rebuild()
     
     return {"message": "Settings updated successfully"}
 
@@ -394,6 +469,8 @@ async def update_system_settings(
 async def get_notifications(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
     unread_only: bool = Query(False),
     current_admin = Depends(verify_admin_token)
 ):
@@ -403,7 +480,7 @@ async def get_notifications(
         filter_dict["is_read"] = False
     
     result = await get_paginated_results(
-        notifications_collection, filter_dict, page, limit, "created_at", -1
+        notifications_collection, filter_dict, page, limit, "created_at", -1, cursor=cursor, with_total=withTotal
     )
     result["items"] = convert_objectid(result["items"])
     
@@ -423,4 +500,6 @@ async def mark_notification_read(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Notification not found")
     
+    invalidate_counts(notifications_collection)
+    
     return {"message": "Notification marked as read"}
\ No newline at end of file
@@ -1,42 +1,42 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 from models import CategoryModel, CategoryCreate, ProductModel
-from database import categories_collection, products_collection, get_paginated_results
+from routes.products import resolve_product_projection
+from http_cache import fetch_with_etag, not_modified, set_etag
+from serialization import DOCUMENT_PROJECTION, JSONBytesResponse, convert_objectid
+from database import categories_collection, products_collection, get_paginated_results, invalidate_counts
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
-def convert_objectid(data):
-    """Convert MongoDB ObjectId to string recursively"""
-    if isinstance(data, dict):
-        if "_id" in data:
-            data.pop("_id", None)  # Remove MongoDB _id field
-        return {key: convert_objectid(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectid(item) for item in data]
-    else:
-        return data
-
 @router.get("/", response_model=List[CategoryModel])
 async def get_categories():
     """Get all categories"""
-    categories = await categories_collection.find({"isActive": True}).to_list(100)
-    cleaned_categories = convert_objectid(categories)
-    return [CategoryModel(**category) for category in cleaned_categories]
+    categories = await categories_collection.find({"isActive": True}, DOCUMENT_PROJECTION).to_list(100)
+    return JSONBytesResponse(categories)
 
 @router.get("/{category_id}", response_model=CategoryModel)
-async def get_category(category_id: str):
+async def get_category(category_id: str, request: Request):
     """Get a specific category"""
-    category = await categories_collection.find_one({"id": category_id, "isActive": True})
+    category, etag, is_not_modified = await fetch_with_etag(
+        categories_collection, {"id": category_id, "isActive": True}, request.headers.get("if-none-match")
+    )
+    if is_not_modified:
+        return not_modified(etag)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-    cleaned_category = convert_objectid(category)
-    return CategoryModel(**cleaned_category)
+    response = JSONBytesResponse(convert_objectid(category))
+    set_etag(response, etag)
+    return response
 
 @router.get("/{category_id}/products")
 async def get_category_products(
     category_id: str,
     page: int = Query(1, ge=1),
-    limit: int = Query(12, ge=1, le=100)
+    limit: int = Query(12, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
+    view: str = Query("full", pattern="^(full|card)$"),
+    fields: Optional[str] = None
 ):
     """Get products in a specific category"""
     
@@ -46,10 +46,9 @@ async def get_category_products(
         raise HTTPException(status_code=404, detail="Category not found")
     
     filter_dict = {"categoryId": category_id}
-    result = await get_paginated_results(products_collection, filter_dict, page, limit)
-    result["items"] = convert_objectid(result["items"])
-    
-    return result
+    projection = resolve_product_projection(view, fields)
+    result = await get_paginated_results(products_collection, filter_dict, page, limit, cursor=cursor, with_total=withTotal, projection=projection)
+    return JSONBytesResponse(result)
 
 @router.post("/", response_model=CategoryModel)
 async def create_category(category: CategoryCreate):
@@ -58,6 +57,7 @@ async def create_category(category: CategoryCreate):
     category_obj = CategoryModel(**category_dict)
     
     await categories_collection.insert_one(category_obj.dict())
+    invalidate_counts(categories_collection)
     return category_obj
 
 @router.put("/{category_id}", response_model=CategoryModel)
@@ -73,6 +73,7 @@ async def update_category(category_id: str, category: CategoryCreate):
     category_obj = CategoryModel(**category_dict)
     
     await categories_collection.replace_one({"id": category_id}, category_obj.dict())
+    invalidate_counts(categories_collection)
     return category_obj
 
 @router.delete("/{category_id}")
@@ -81,4 +82,5 @@ async def delete_category(category_id: str):
     result = await categories_collection.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    invalidate_counts(categories_collection)
     return {"message": "Category deleted successfully"}
\ No newline at end of file
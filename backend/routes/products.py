@@ -1,38 +1,68 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional, List
-from models import ProductModel, ProductCreate, PaginationParams, PaginatedResponse
-from database import products_collection, get_paginated_results
-import re
+from models import ProductModel, ProductCreate, ProductBatchRequest, PaginationParams, PaginatedResponse
+from database import products_collection, get_paginated_results, invalidate_counts
+from search import product_search_index, regex_search_filter, search_products_page
+from facets import count_facets, facet_cache, facet_cache_key, get_facet_counts, get_facet_page
+from cache import TTLCache
+from trending import top_product_ids
+from http_cache import document_etag, etag_matches, fetch_with_etag, not_modified, set_etag
+from serialization import DOCUMENT_PROJECTION, JSONBytesResponse, convert_objectid, dumps
+from pymongo import ReturnDocument
+from datetime import datetime
+import asyncio
+import os
 
 router = APIRouter(prefix="/products", tags=["products"])
 
-def convert_objectid(data):
-    """Convert MongoDB ObjectId to string recursively"""
-    if isinstance(data, dict):
-        if "_id" in data:
-            data.pop("_id", None)  # Remove MongoDB _id field
-        return {key: convert_objectid(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectid(item) for item in data]
+# Homepage rails, stored as ready-to-send JSON bytes
+RAIL_CACHE_TTL_SECONDS = float(os.environ.get('RAIL_CACHE_TTL_SECONDS', '60'))
+rail_cache = TTLCache(ttl=RAIL_CACHE_TTL_SECONDS, max_size=16)
+
+# Product documents by id, shared by the detail and batch endpoints
+PRODUCT_CACHE_TTL_SECONDS = float(os.environ.get('PRODUCT_CACHE_TTL_SECONDS', '30'))
+product_cache = TTLCache(ttl=PRODUCT_CACHE_TTL_SECONDS, max_size=10000)
+
+# Full product documents without `_id` and the internal rating counters
+PRODUCT_PROJECTION = {**DOCUMENT_PROJECTION, "ratingStats": 0}
+
+# Fields a product grid tile needs
+CARD_FIELDS = [
+    "id", "title", "titleEn", "price", "originalPrice", "currency",
+    "rating", "reviewCount", "image", "discount", "inStock", "isNew"
+]
+
+def resolve_product_projection(view: str = "full", fields: Optional[str] = None):
+    """Mongo projection for product listings; `_id` is always excluded.
+
+    `fields` is a comma separated list of ProductModel fields and takes
+    precedence over `view`. `id` and `createdAt` are always kept because
+    pagination cursors are built from them.
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in ProductModel.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown product fields: {', '.join(unknown)}")
+    elif view == "card":
+        requested = CARD_FIELDS
     else:
-        return data
+        return PRODUCT_PROJECTION
+    
+    projection = {"_id": 0, "id": 1, "createdAt": 1}
+    projection.update({field: 1 for field in requested})
+    return projection
 
-@router.get("/", response_model=dict)
-async def get_products(
-    page: int = Query(1, ge=1),
-    limit: int = Query(12, ge=1, le=100),
+def build_product_filter(
     categoryId: Optional[str] = None,
     sellerId: Optional[str] = None,
     minPrice: Optional[float] = None,
     maxPrice: Optional[float] = None,
     inStock: Optional[bool] = None,
     isNew: Optional[bool] = None,
-    isFeatured: Optional[bool] = None,
-    search: Optional[str] = None
+    isFeatured: Optional[bool] = None
 ):
-    """Get products with filtering and pagination"""
-    
-    # Build filter
+    """Build a Mongo filter from the product listing query parameters"""
     filter_dict = {}
     
     if categoryId:
@@ -52,39 +82,120 @@ async def get_products(
         filter_dict["isNew"] = isNew
     if isFeatured is not None:
         filter_dict["isFeatured"] = isFeatured
-    if search:
-        filter_dict["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
     
-    result = await get_paginated_results(products_collection, filter_dict, page, limit)
+    return filter_dict
+
+def invalidate_product_caches(product_id: Optional[str] = None):
+    """Drop cached data derived from the products collection.
+    
+    Without a product id every cached product document is dropped too.
+    """
+    invalidate_counts(products_collection)
+    facet_cache.clear()
+    rail_cache.clear()
+    if product_id is None:
+        product_cache.clear()
+    else:
+        product_cache.invalidate(product_id)
+
+async def get_cached_products(product_ids: List[str]):
+    """Resolve products by id through the cache, with one $in query for misses"""
+    found = {}
+    misses = []
+    for product_id in product_ids:
+        product = product_cache.get(product_id)
+        if product is None:
+            misses.append(product_id)
+        else:
+            found[product_id] = product
+    
+    if misses:
+        async for product in products_collection.find({"id": {"$in": misses}}, PRODUCT_PROJECTION):
+            product_cache.set(product["id"], product)
+            found[product["id"]] = product
+    
+    return found
+
+async def serve_rail(name: str, load_products):
+    """Serve a homepage rail from the cache, loading it once on a miss"""
+    async def load():
+        return dumps(convert_objectid(await load_products()))
+    
+    body = await rail_cache.get_or_load(name, load)
+    return JSONBytesResponse(body)
+
+@router.get("/", response_model=dict)
+async def get_products(
+    page: int = Query(1, ge=1),
+    limit: int = Query(12, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
+    categoryId: Optional[str] = None,
+    sellerId: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    inStock: Optional[bool] = None,
+    isNew: Optional[bool] = None,
+    isFeatured: Optional[bool] = None,
+    search: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|card)$"),
+    fields: Optional[str] = None
+):
+    """Get products with filtering and pagination"""
+    
+    filter_dict = build_product_filter(categoryId, sellerId, minPrice, maxPrice, inStock, isNew, isFeatured)
+    projection = resolve_product_projection(view, fields)
     
-    # Clean ObjectIds from result
-    result["items"] = convert_objectid(result["items"])
+    if search:
+        search_filters = {
+            "categoryId": categoryId,
+            "sellerId": sellerId,
+            "minPrice": minPrice,
+            "maxPrice": maxPrice,
+            "inStock": inStock,
+            "isNew": isNew,
+            "isFeatured": isFeatured
+        }
+        result = await search_products_page(products_collection, search, search_filters, page, limit, projection)
+    else:
+        result = await get_paginated_results(products_collection, filter_dict, page, limit, cursor=cursor, with_total=withTotal, projection=projection)
     
-    return result
+    return JSONBytesResponse(result)
 
 @router.get("/featured", response_model=List[ProductModel])
 async def get_featured_products():
     """Get featured products"""
-    products = await products_collection.find({"isFeatured": True}).to_list(20)
-    cleaned_products = convert_objectid(products)
-    return [ProductModel(**product) for product in cleaned_products]
+    return await serve_rail(
+        "featured",
+        lambda: products_collection.find({"isFeatured": True}, PRODUCT_PROJECTION).to_list(20)
+    )
 
 @router.get("/new", response_model=List[ProductModel])
 async def get_new_products():
     """Get new products"""
-    products = await products_collection.find({"isNew": True}).to_list(20)
-    cleaned_products = convert_objectid(products)
-    return [ProductModel(**product) for product in cleaned_products]
+    return await serve_rail(
+        "new",
+        lambda: products_collection.find({"isNew": True}, PRODUCT_PROJECTION).to_list(20)
+    )
 
 @router.get("/trending", response_model=List[ProductModel])
 async def get_trending_products():
-    """Get trending products (highest rated)"""
-    products = await products_collection.find({}).sort("rating", -1).limit(8).to_list(8)
-    cleaned_products = convert_objectid(products)
-    return [ProductModel(**product) for product in cleaned_products]
+    """Get trending products from the time-decayed leaderboard"""
+    async def load_trending():
+        ids = await top_product_ids(8)
+        products = await products_collection.find({"id": {"$in": ids}}, PRODUCT_PROJECTION).to_list(len(ids))
+        by_id = {product["id"]: product for product in products}
+        trending = [by_id[product_id] for product_id in ids if product_id in by_id]
+        
+        # Until enough activity is recorded, fill up with the highest rated
+        if len(trending) < 8:
+            fill = await products_collection.find(
+                {"id": {"$nin": [product["id"] for product in trending]}}, PRODUCT_PROJECTION
+            ).sort("rating", -1).limit(8 - len(trending)).to_list(8)
+            trending.extend(fill)
+        return trending
+    
+    return await serve_rail("trending", load_trending)
 
 @router.get("/search")
 async def search_products(
@@ -93,42 +204,108 @@ async def search_products(
     limit: int = Query(12, ge=1, le=100),
     categoryId: Optional[str] = None,
     minPrice: Optional[float] = None,
-    maxPrice: Optional[float] = None
+    maxPrice: Optional[float] = None,
+    view: str = Query("full", pattern="^(full|card)$"),
+    fields: Optional[str] = None
 ):
     """Search products"""
     
-    filter_dict = {
-        "$or": [
-            {"title": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"titleEn": {"$regex": q, "$options": "i"}}
-        ]
+    search_filters = {
+        "categoryId": categoryId,
+        "minPrice": minPrice,
+        "maxPrice": maxPrice
     }
     
-    if categoryId:
-        filter_dict["categoryId"] = categoryId
-    if minPrice is not None:
-        filter_dict["price"] = {"$gte": minPrice}
-    if maxPrice is not None:
-        if "price" in filter_dict:
-            filter_dict["price"]["$lte"] = maxPrice
-        else:
-            filter_dict["price"] = {"$lte": maxPrice}
+    projection = resolve_product_projection(view, fields)
+    result = await search_products_page(products_collection, q, search_filters, page, limit, projection)
+    return JSONBytesResponse(result)
+
+@router.get("/facets")
+async def get_products_with_facets(
+    page: int = Query(1, ge=1),
+    limit: int = Query(12, ge=1, le=100),
+    categoryId: Optional[str] = None,
+    sellerId: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    inStock: Optional[bool] = None,
+    isNew: Optional[bool] = None,
+    isFeatured: Optional[bool] = None,
+    search: Optional[str] = None
+):
+    """Get a page of products together with sidebar facet counts"""
+    params = {
+        "categoryId": categoryId,
+        "sellerId": sellerId,
+        "minPrice": minPrice,
+        "maxPrice": maxPrice,
+        "inStock": inStock,
+        "isNew": isNew,
+        "isFeatured": isFeatured,
+        "search": search
+    }
+    
+    filter_dict = build_product_filter(categoryId, sellerId, minPrice, maxPrice, inStock, isNew, isFeatured)
+    ranked_ids = None
+    if search and product_search_index.ready:
+        # Already narrowed by the filters, so only the requested page goes to Mongo
+        ranked_ids = product_search_index.search(search, params)
+    elif search:
+        filter_dict = regex_search_filter(search, params)
     
-    result = await get_paginated_results(products_collection, filter_dict, page, limit)
-    result["items"] = convert_objectid(result["items"])
+    async def load_counts():
+        if ranked_ids is not None:
+            return count_facets(product_search_index.attributes(product_id) for product_id in ranked_ids)
+        return await get_facet_counts(products_collection, filter_dict)
     
-    return result
+    # Counts do not depend on the page, so every page shares one cache entry
+    counts, items = await asyncio.gather(
+        facet_cache.get_or_load(facet_cache_key(params), load_counts),
+        get_facet_page(products_collection, filter_dict, page, limit, ranked_ids)
+    )
+    total = counts["total"]
+    return JSONBytesResponse({
+        "items": items,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "totalPages": (total + limit - 1) // limit,
+        "facets": counts["facets"]
+    })
 
 @router.get("/{product_id}", response_model=ProductModel)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get a specific product"""
-    product = await products_collection.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    if_none_match = request.headers.get("if-none-match")
+    product = product_cache.get(product_id)
+    if product is None:
+        product, etag, is_not_modified = await fetch_with_etag(
+            products_collection, {"id": product_id}, if_none_match, PRODUCT_PROJECTION
+        )
+        if is_not_modified:
+            return not_modified(etag)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product = convert_objectid(product)
+        product_cache.set(product_id, product)
     
-    cleaned_product = convert_objectid(product)
-    return ProductModel(**cleaned_product)
+    etag = document_etag(product)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response = JSONBytesResponse(product)
+    set_etag(response, etag)
+    return response
+
+@router.post("/batch", response_model=dict)
+async def get_products_batch(batch: ProductBatchRequest):
+    """Get several products in one call, in the requested order"""
+    product_ids = list(dict.fromkeys(batch.ids))
+    found = await get_cached_products(product_ids)
+    
+    return JSONBytesResponse({
+        "items": [found[product_id] for product_id in product_ids if product_id in found],
+        "missing": [product_id for product_id in product_ids if product_id not in found]
+    })
 
 @router.post("/", response_model=ProductModel)
 async def create_product(product: ProductCreate):
@@ -137,21 +314,26 @@ async def create_product(product: ProductCreate):
     product_obj = ProductModel(**product_dict)
     
     await products_collection.insert_one(product_obj.dict())
+    product_search_index.index_product(product_obj.dict())
+    invalidate_product_caches(product_obj.id)
     return product_obj
 
 @router.put("/{product_id}", response_model=ProductModel)
 async def update_product(product_id: str, product: ProductCreate):
     """Update a product"""
-    existing_product = await products_collection.find_one({"id": product_id})
-    if not existing_product:
+    # Only the editable fields are set; rating counters are maintained by review writes
+    updated_product = await products_collection.find_one_and_update(
+        {"id": product_id},
+        {"$set": {**product.dict(), "updatedAt": datetime.utcnow()}},
+        projection=PRODUCT_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    product_dict = product.dict()
-    product_dict["id"] = product_id
-    product_dict["createdAt"] = existing_product["createdAt"]
-    product_obj = ProductModel(**product_dict)
-    
-    await products_collection.replace_one({"id": product_id}, product_obj.dict())
+    product_obj = ProductModel(**updated_product)
+    product_search_index.index_product(product_obj.dict())
+    invalidate_product_caches(product_id)
     return product_obj
 
 @router.delete("/{product_id}")
@@ -160,4 +342,6 @@ async def delete_product(product_id: str):
     result = await products_collection.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_search_index.remove_product(product_id)
+    invalidate_product_caches(product_id)
     return {"message": "Product deleted successfully"}
\ No newline at end of file
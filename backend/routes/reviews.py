@@ -1,20 +1,79 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from typing import List, Optional
 from models import ReviewModel, ReviewCreate
-from database import reviews_collection, products_collection
+from database import reviews_collection, products_collection, get_keyset_results, invalidate_counts
+from routes.products import rail_cache, product_cache
+from trending import record_review
+from ratings import add_review_rating, remove_review_rating, get_rating_summary, COUNTED_FIELD
+from serialization import DOCUMENT_PROJECTION, JSONBytesResponse
+from counter_buffer import CounterBuffer
+from cache import TTLCache
+import os
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
+# "Helpful" votes are buffered and written in batches; started and flushed by server.py
+HELPFUL_FLUSH_INTERVAL_SECONDS = float(os.environ.get('HELPFUL_FLUSH_INTERVAL_SECONDS', '2'))
+HELPFUL_FLUSH_MAX_PENDING = int(os.environ.get('HELPFUL_FLUSH_MAX_PENDING', '1000'))
+helpful_votes = CounterBuffer(reviews_collection, "helpful", HELPFUL_FLUSH_INTERVAL_SECONDS, HELPFUL_FLUSH_MAX_PENDING)
+
+# Review ids known to exist, so repeated votes skip the lookup
+known_reviews = TTLCache(ttl=300, max_size=10000)
+
+REVIEW_PROJECTION = {**DOCUMENT_PROJECTION, COUNTED_FIELD: 0}
+
+# sort option -> (field, order); ties are broken by review id
+REVIEW_SORTS = {
+    "newest": ("date", -1),
+    "oldest": ("date", 1),
+    "helpful": ("helpful", -1)
+}
+
 @router.get("/products/{product_id}", response_model=List[ReviewModel])
-async def get_product_reviews(product_id: str):
-    """Get all reviews for a specific product"""
-    # Check if product exists
-    product = await products_collection.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+async def get_product_reviews(
+    product_id: str,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: str = Query("newest", pattern="^(newest|oldest|helpful)$"),
+    rating: Optional[int] = Query(None, ge=1, le=5),
+    withTotal: bool = False
+):
+    """Get reviews for a specific product.
+    
+    Without `cursor` the first `limit` reviews are returned as a list.
+    Passing `cursor` (empty for the first page) returns a keyset page with
+    `next`/`prev` tokens instead.
+    """
+    filter_dict = {"productId": product_id}
+    if rating is not None:
+        filter_dict["rating"] = rating
+    sort_field, sort_order = REVIEW_SORTS[sort]
+    
+    result = await get_keyset_results(
+        reviews_collection, filter_dict, limit, cursor or "", sort_field, sort_order,
+        with_total=withTotal, projection=REVIEW_PROJECTION
+    )
+    
+    # Only an empty first page needs to tell a missing product from one without reviews
+    if not result["items"] and not cursor:
+        if not await products_collection.find_one({"id": product_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Product not found")
     
-    reviews = await reviews_collection.find({"productId": product_id}).sort("date", -1).to_list(100)
-    return [ReviewModel(**review) for review in reviews]
+    # Include votes that are still buffered
+    for review in result["items"]:
+        review["helpful"] = review.get("helpful", 0) + helpful_votes.pending(review["id"])
+    
+    if cursor is None:
+        return JSONBytesResponse(result["items"])
+    return JSONBytesResponse(result)
+
+@router.get("/products/{product_id}/summary")
+async def get_product_rating_summary(product_id: str):
+    """Get the star distribution, average and verified share of a product's reviews"""
+    summary = await get_rating_summary(product_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return summary
 
 @router.post("/products/{product_id}", response_model=ReviewModel)
 async def create_review(product_id: str, review: ReviewCreate):
@@ -29,66 +88,43 @@ async def create_review(product_id: str, review: ReviewCreate):
     review_dict["productId"] = product_id
     review_obj = ReviewModel(**review_dict)
     
-    await reviews_collection.insert_one(review_obj.dict())
+    await reviews_collection.insert_one({**review_obj.dict(), COUNTED_FIELD: False})
+    invalidate_counts(reviews_collection)
     
     # Update product rating and review count
-    all_reviews = await reviews_collection.find({"productId": product_id}).to_list(1000)
-    new_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews)
-    
-    await products_collection.update_one(
-        {"id": product_id},
-        {
-            "$set": {
-                "rating": round(new_rating, 1),
-                "reviewCount": len(all_reviews)
-            }
-        }
-    )
+    await add_review_rating(product_id, review_obj.dict())
+    await record_review(product_id, review_obj.rating)
+    rail_cache.clear()
+    product_cache.invalidate(product_id)
     
     return review_obj
 
 @router.put("/reviews/{review_id}/helpful")
 async def mark_review_helpful(review_id: str):
     """Mark a review as helpful"""
-    result = await reviews_collection.update_one(
-        {"id": review_id},
-        {"$inc": {"helpful": 1}}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Review not found")
+    if known_reviews.get(review_id) is None:
+        if not await reviews_collection.find_one({"id": review_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Review not found")
+        known_reviews.set(review_id, True)
     
+    helpful_votes.increment(review_id)
     return {"message": "Review marked as helpful"}
 
 @router.delete("/reviews/{review_id}")
 async def delete_review(review_id: str):
     """Delete a review"""
-    review = await reviews_collection.find_one({"id": review_id})
+    # Delete review; only the request that actually removed it adjusts the counters
+    review = await reviews_collection.find_one_and_delete({"id": review_id})
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
-    
-    # Delete review
-    await reviews_collection.delete_one({"id": review_id})
+    invalidate_counts(reviews_collection)
+    known_reviews.invalidate(review_id)
+    helpful_votes.discard(review_id)
     
     # Update product rating and review count
     product_id = review["productId"]
-    remaining_reviews = await reviews_collection.find({"productId": product_id}).to_list(1000)
-    
-    if remaining_reviews:
-        new_rating = sum(r["rating"] for r in remaining_reviews) / len(remaining_reviews)
-        new_count = len(remaining_reviews)
-    else:
-        new_rating = 0
-        new_count = 0
-    
-    await products_collection.update_one(
-        {"id": product_id},
-        {
-            "$set": {
-                "rating": round(new_rating, 1),
-                "reviewCount": new_count
-            }
-        }
-    )
+    await remove_review_rating(product_id, review)
+    rail_cache.clear()
+    product_cache.invalidate(product_id)
     
     return {"message": "Review deleted successfully"}
\ No newline at end of file
@@ -1,42 +1,42 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 from models import SellerModel, SellerCreate, ProductModel
-from database import sellers_collection, products_collection, get_paginated_results
+from routes.products import resolve_product_projection
+from http_cache import fetch_with_etag, not_modified, set_etag
+from serialization import DOCUMENT_PROJECTION, JSONBytesResponse, convert_objectid
+from database import sellers_collection, products_collection, get_paginated_results, invalidate_counts
 
 router = APIRouter(prefix="/sellers", tags=["sellers"])
 
-def convert_objectid(data):
-    """Convert MongoDB ObjectId to string recursively"""
-    if isinstance(data, dict):
-        if "_id" in data:
-            data.pop("_id", None)  # Remove MongoDB _id field
-        return {key: convert_objectid(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectid(item) for item in data]
-    else:
-        return data
-
 @router.get("/", response_model=List[SellerModel])
 async def get_sellers():
     """Get all sellers"""
-    sellers = await sellers_collection.find({}).sort("rating", -1).to_list(100)
-    cleaned_sellers = convert_objectid(sellers)
-    return [SellerModel(**seller) for seller in cleaned_sellers]
+    sellers = await sellers_collection.find({}, DOCUMENT_PROJECTION).sort("rating", -1).to_list(100)
+    return JSONBytesResponse(sellers)
 
 @router.get("/{seller_id}", response_model=SellerModel)
-async def get_seller(seller_id: str):
+async def get_seller(seller_id: str, request: Request):
     """Get a specific seller"""
-    seller = await sellers_collection.find_one({"id": seller_id})
+    seller, etag, is_not_modified = await fetch_with_etag(
+        sellers_collection, {"id": seller_id}, request.headers.get("if-none-match")
+    )
+    if is_not_modified:
+        return not_modified(etag)
     if not seller:
         raise HTTPException(status_code=404, detail="Seller not found")
-    cleaned_seller = convert_objectid(seller)
-    return SellerModel(**cleaned_seller)
+    response = JSONBytesResponse(convert_objectid(seller))
+    set_etag(response, etag)
+    return response
 
 @router.get("/{seller_id}/products")
 async def get_seller_products(
     seller_id: str,
     page: int = Query(1, ge=1),
-    limit: int = Query(12, ge=1, le=100)
+    limit: int = Query(12, ge=1, le=100),
+    cursor: Optional[str] = None,
+    withTotal: bool = True,
+    view: str = Query("full", pattern="^(full|card)$"),
+    fields: Optional[str] = None
 ):
     """Get products from a specific seller"""
     
@@ -46,12 +46,9 @@ async def get_seller_products(
         raise HTTPException(status_code=404, detail="Seller not found")
     
     filter_dict = {"sellerId": seller_id}
-    result = await get_paginated_results(products_collection, filter_dict, page, limit)
-    
-    # Clean ObjectIds from result
-    result["items"] = convert_objectid(result["items"])
-    
-    return result
+    projection = resolve_product_projection(view, fields)
+    result = await get_paginated_results(products_collection, filter_dict, page, limit, cursor=cursor, with_total=withTotal, projection=projection)
+    return JSONBytesResponse(result)
 
 @router.post("/", response_model=SellerModel)
 async def create_seller(seller: SellerCreate):
@@ -60,6 +57,7 @@ async def create_seller(seller: SellerCreate):
     seller_obj = SellerModel(**seller_dict)
     
     await sellers_collection.insert_one(seller_obj.dict())
+    invalidate_counts(sellers_collection)
     return seller_obj
 
 @router.put("/{seller_id}", response_model=SellerModel)
@@ -75,6 +73,7 @@ async def update_seller(seller_id: str, seller: SellerCreate):
     seller_obj = SellerModel(**seller_dict)
     
     await sellers_collection.replace_one({"id": seller_id}, seller_obj.dict())
+    invalidate_counts(sellers_collection)
     return seller_obj
 
 @router.delete("/{seller_id}")
@@ -83,4 +82,5 @@ async def delete_seller(seller_id: str):
     result = await sellers_collection.delete_one({"id": seller_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Seller not found")
+    invalidate_counts(sellers_collection)
     return {"message": "Seller deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+In-memory inverted index for product search.
+
+Replaces the unanchored `$regex` scans over `title`, `titleEn` and
+`description`. The index is built once at startup, kept current by the
+product write endpoints, and answers queries without touching MongoDB;
+only the requested page of documents is then fetched by `id`.
+
+Until the index has been built successfully, searches fall back to the
+escaped `$regex` query so results never silently come back empty.
+
+Each worker process holds its own index. Writes made through another
+worker, or straight to the database, are picked up by `run_refresh_loop`:
+every SEARCH_INDEX_REFRESH_SECONDS it re-indexes products whose `updatedAt`
+moved, and every SEARCH_INDEX_FULL_REBUILD_SECONDS it rebuilds from scratch
+so deletions made elsewhere drop out too.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from text_normalization import char_ngrams, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of a term hit in each indexed field
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "titleEn": 3.0,
+    "description": 1.0,
+}
+
+# Document attributes kept next to the postings so filters never hit Mongo
+FILTER_FIELDS = ("categoryId", "sellerId", "price", "inStock", "isNew", "isFeatured")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Only the last query token is treated as a prefix (type-ahead). A shorter
+# trailing prefix would expand to most of the vocabulary, so after other
+# tokens it only boosts the products they matched instead of filtering
+MIN_PREFIX_LENGTH = 2
+SHORT_PREFIX_BOOST = 0.5
+
+# Typo tolerance: a query token with no exact or prefix hit is matched
+# against vocabulary terms sharing enough character trigrams
+FUZZY_MIN_LENGTH = 3
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MAX_TERMS = 10
+
+SEARCH_INDEX_REFRESH_SECONDS = float(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', '30'))
+SEARCH_INDEX_FULL_REBUILD_SECONDS = float(os.environ.get('SEARCH_INDEX_FULL_REBUILD_SECONDS', '3600'))
+# Re-read a little before the last sync to absorb clock skew between workers
+SYNC_OVERLAP = timedelta(seconds=5)
+
+_INDEX_PROJECTION = {"_id": 0, "id": 1, **{field: 1 for field in (*FIELD_WEIGHTS, *FILTER_FIELDS)}}
+
+class ProductSearchIndex:
+    """Inverted index with BM25 ranking and attribute filters"""
+
+    def __init__(self):
+        # term -> {product_id: weighted term frequency}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # Sorted vocabulary for prefix expansion
+        self._vocabulary: List[str] = []
+        # trigram -> vocabulary terms containing it, for typo tolerance
+        self._gram_terms: Dict[str, Set[str]] = defaultdict(set)
+        # product_id -> terms, so a document can be removed without a rescan
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._doc_attributes: Dict[str, Dict[str, Any]] = {}
+        self._total_length = 0.0
+        self.ready = False
+        # When the last rebuild or refresh started reading
+        self.synced_at: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _add_term(self, term: str, product_id: str, weight: float):
+        postings = self._postings[term]
+        if not postings:
+            bisect.insort(self._vocabulary, term)
+            for gram in char_ngrams(term):
+                self._gram_terms[gram].add(term)
+        postings[product_id] = postings.get(product_id, 0.0) + weight
+
+    def _remove_term(self, term: str, product_id: str):
+        postings = self._postings.get(term)
+        if postings is None:
+            return
+        postings.pop(product_id, None)
+        if not postings:
+            del self._postings[term]
+            position = bisect.bisect_left(self._vocabulary, term)
+            if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                del self._vocabulary[position]
+            for gram in char_ngrams(term):
+                terms = self._gram_terms.get(gram)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._gram_terms[gram]
+
+    def index_product(self, product: Dict[str, Any]):
+        """Add or replace a product in the index"""
+        product_id = product.get("id")
+        if not product_id:
+            return
+        self.remove_product(product_id)
+
+        terms: Set[str] = set()
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field) or ""):
+                self._add_term(token, product_id, weight)
+                terms.add(token)
+                length += weight
+
+        self._doc_terms[product_id] = terms
+        self._doc_lengths[product_id] = length
+        self._doc_attributes[product_id] = {field: product.get(field) for field in FILTER_FIELDS}
+        self._total_length += length
+
+    def remove_product(self, product_id: str):
+        """Remove a product from the index if present"""
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            self._remove_term(term, product_id)
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+        self._doc_attributes.pop(product_id, None)
+
+    def attributes(self, product_id: str) -> Dict[str, Any]:
+        """Indexed filter fields of a product (see FILTER_FIELDS)"""
+        return self._doc_attributes.get(product_id, {})
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _fuzzy_terms(self, token: str) -> Dict[str, float]:
+        """Vocabulary terms similar to token, with their Dice similarity"""
+        grams = set(char_ngrams(token))
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for term in self._gram_terms.get(gram, ()):
+                shared[term] += 1
+
+        similar = {}
+        for term, count in shared.items():
+            similarity = 2 * count / (len(grams) + len(set(char_ngrams(term))))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                similar[term] = similarity
+        best = sorted(similar, key=lambda term: -similar[term])[:FUZZY_MAX_TERMS]
+        return {term: similar[term] for term in best}
+
+    def _candidate_terms(self, token: str, as_prefix: bool) -> Dict[str, float]:
+        """Index terms that satisfy one query token, with a score multiplier"""
+        if as_prefix:
+            terms = self._expand_prefix(token)
+        else:
+            terms = [token] if token in self._postings else []
+        if terms:
+            return {term: 1.0 for term in terms}
+        if len(token) >= FUZZY_MIN_LENGTH:
+            # Near misses rank below exact matches in proportion to similarity
+            return self._fuzzy_terms(token)
+        return {}
+
+    def _matches_filters(self, product_id: str, filters: Dict[str, Any]) -> bool:
+        attributes = self._doc_attributes.get(product_id, {})
+        for field in ("categoryId", "sellerId", "inStock", "isNew", "isFeatured"):
+            expected = filters.get(field)
+            if expected is not None and attributes.get(field) != expected:
+                return False
+
+        price = attributes.get("price")
+        min_price = filters.get("minPrice")
+        max_price = filters.get("maxPrice")
+        if min_price is not None and (price is None or price < min_price):
+            return False
+        if max_price is not None and (price is None or price > max_price):
+            return False
+        return True
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Return ids of matching products, best match first.
+
+        Every query token must match (the last one as a prefix, and any
+        token without a hit by trigram similarity); results are ranked with
+        BM25 over the field-weighted term frequencies. A last token shorter
+        than MIN_PREFIX_LENGTH that follows other tokens is optional.
+        """
+        tokens = tokenize(query)
+        if not tokens or not self._doc_terms:
+            return []
+
+        doc_count = len(self._doc_terms)
+        avg_length = (self._total_length / doc_count) or 1.0
+        scores: Optional[Dict[str, float]] = None
+
+        short_tail = None
+        if len(tokens) > 1 and len(tokens[-1]) < MIN_PREFIX_LENGTH:
+            short_tail = tokens.pop()
+
+        for position, token in enumerate(tokens):
+            token_scores: Dict[str, float] = {}
+            candidates = self._candidate_terms(token, position == len(tokens) - 1)
+            for term, multiplier in candidates.items():
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[product_id] / avg_length)
+                    score = multiplier * idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    if score > token_scores.get(product_id, 0.0):
+                        token_scores[product_id] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    product_id: score + token_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in token_scores
+                }
+            if not scores:
+                return []
+
+        if short_tail is not None:
+            for product_id in scores:
+                if any(term.startswith(short_tail) for term in self._doc_terms[product_id]):
+                    scores[product_id] *= 1 + SHORT_PREFIX_BOOST
+
+        if filters:
+            scores = {
+                product_id: score for product_id, score in scores.items()
+                if self._matches_filters(product_id, filters)
+            }
+
+        return sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+
+    async def rebuild(self, collection):
+        """Rebuild the index from the products collection"""
+        started_at = datetime.utcnow()
+        fresh = ProductSearchIndex()
+        count = 0
+        async for product in collection.find({}, _INDEX_PROJECTION):
+            fresh.index_product(product)
+            count += 1
+            if count % 1000 == 0:
+                # Let other requests run while a large catalog is indexed
+                await asyncio.sleep(0)
+
+        self.__dict__.update(fresh.__dict__)
+        self.ready = True
+        self.synced_at = started_at
+        logger.info(f"Product search index built with {count} products")
+
+    async def refresh(self, collection):
+        """Re-index products changed since the last sync"""
+        started_at = datetime.utcnow()
+        changed = {"updatedAt": {"$gte": self.synced_at - SYNC_OVERLAP}}
+        async for product in collection.find(changed, _INDEX_PROJECTION):
+            self.index_product(product)
+        self.synced_at = started_at
+
+    async def run_refresh_loop(self, collection):
+        """Keep the index in step with writes from other workers; run as a task"""
+        last_rebuild = datetime.utcnow()
+        while True:
+            await asyncio.sleep(SEARCH_INDEX_REFRESH_SECONDS)
+            try:
+                if not self.ready or (datetime.utcnow() - last_rebuild).total_seconds() >= SEARCH_INDEX_FULL_REBUILD_SECONDS:
+                    await self.rebuild(collection)
+                    last_rebuild = datetime.utcnow()
+                else:
+                    await self.refresh(collection)
+            except Exception as e:
+                logger.error(f"Error refreshing product search index: {e}")
+
+# Shared index used by the product routes
+product_search_index = ProductSearchIndex()
+
+def regex_search_filter(query: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Mongo filter equivalent to a search, for use while the index is not ready"""
+    pattern = {"$regex": re.escape(query.strip()), "$options": "i"}
+    filter_dict: Dict[str, Any] = {"$or": [{field: pattern} for field in FIELD_WEIGHTS]}
+    for field in ("categoryId", "sellerId", "inStock", "isNew", "isFeatured"):
+        if filters.get(field) is not None:
+            filter_dict[field] = filters[field]
+    price = {}
+    if filters.get("minPrice") is not None:
+        price["$gte"] = filters["minPrice"]
+    if filters.get("maxPrice") is not None:
+        price["$lte"] = filters["maxPrice"]
+    if price:
+        filter_dict["price"] = price
+    return filter_dict
+
+async def _regex_search_page(collection, query, filters, page, limit, projection):
+    filter_dict = regex_search_filter(query, filters)
+    skip = (page - 1) * limit
+    items = await collection.find(filter_dict, projection).sort("createdAt", -1).skip(skip).limit(limit).to_list(limit)
+    total = await collection.count_documents(filter_dict)
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "totalPages": (total + limit - 1) // limit
+    }
+
+async def search_products_page(
+    collection,
+    query: str,
+    filters: Dict[str, Any],
+    page: int,
+    limit: int,
+    projection: Optional[Dict[str, Any]] = None,
+):
+    """Run a search and fetch one page of matching products by id.
+
+    Returns the same shape as `database.get_paginated_results`.
+    """
+    if not product_search_index.ready:
+        return await _regex_search_page(collection, query, filters, page, limit, projection)
+    
+    ranked_ids = product_search_index.search(query, filters)
+    total = len(ranked_ids)
+    skip = (page - 1) * limit
+    page_ids = ranked_ids[skip:skip + limit]
+
+    items = []
+    if page_ids:
+        documents = await collection.find({"id": {"$in": page_ids}}, projection).to_list(len(page_ids))
+        by_id = {document["id"]: document for document in documents}
+        # Ids deleted by another worker since indexing are simply dropped
+        items = [by_id[product_id] for product_id in page_ids if product_id in by_id]
+
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "totalPages": (total + limit - 1) // limit
+    }
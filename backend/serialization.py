@@ -0,0 +1,55 @@
+"""
+Shared response serialization.
+
+Documents read back from Mongo were validated by our models when they were
+written, so read endpoints send them as they are: `_id` is excluded by the
+query projection and the result is encoded straight to JSON bytes, skipping
+a second round of Pydantic validation and `jsonable_encoder`.
+
+orjson is used when installed; the standard library encoder is the fallback.
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Projection that leaves out MongoDB's ObjectId
+DOCUMENT_PROJECTION = {"_id": 0}
+
+def convert_objectid(data):
+    """Drop MongoDB's `_id` from a document or a list of documents in place"""
+    if isinstance(data, dict):
+        data.pop("_id", None)
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                item.pop("_id", None)
+    return data
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(data: Any) -> bytes:
+    """Encode data as UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+class JSONBytesResponse(Response):
+    """JSON response rendered with `dumps`, bypassing response_model validation"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
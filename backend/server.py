@@ -1,10 +1,8 @@
-from fastapi import FastAPI, APIRouter
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, Depends, Request
+from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+import asyncio
 import logging
-from pathlib import Path
 
 # Import routes
 from routes.products import router as products_router
@@ -15,20 +13,23 @@ from routes.admin import router as admin_router
 from routes.accounting import router as accounting_router
 
 # Import database initialization
-from database import init_sample_data
-from routes.admin import init_default_admin
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from db_provider import client, db, pool_metrics
+from database import init_sample_data, backfill_updated_at, products_collection, InvalidCursorError
+from search import product_search_index
+from indexes import ensure_indexes
+from routes.admin import init_default_admin, verify_admin_token
+from routes.reviews import helpful_votes
+from analytics import get_reporting_timezone
+from order_rollups import ensure_rollups
+import passwords
 
 # Create the main app without a prefix
 app = FastAPI(title="Souq Express API", description="API for Souq Express E-commerce Platform", version="1.0.0")
 
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -41,6 +42,11 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "souq-express-api"}
 
+@api_router.get("/health/db-pool")
+async def db_pool_metrics(current_admin = Depends(verify_admin_token)):
+    """MongoDB connection pool usage, per server address (admins only)"""
+    return pool_metrics.snapshot()
+
 # Include all routers
 api_router.include_router(products_router)
 api_router.include_router(categories_router)
@@ -58,6 +64,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Export-Watermark"],
 )
 
 # Configure logging
@@ -71,15 +78,37 @@ logger = logging.getLogger(__name__)
 async def startup_db_client():
     """Initialize database with sample data on startup"""
     logger.info("Starting up Souq Express API...")
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Error creating indexes: {e}")
+    
     try:
         await init_sample_data()
+        await backfill_updated_at()
         await init_default_admin()
         logger.info("Database and admin data initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
+    
+    try:
+        await product_search_index.rebuild(products_collection)
+    except Exception as e:
+        logger.error(f"Error building product search index: {e}")
+    
+    try:
+        await ensure_rollups(await get_reporting_timezone())
+    except Exception as e:
+        logger.error(f"Error building order rollups: {e}")
+    
+    helpful_votes.start()
+    app.state.search_refresh = asyncio.create_task(product_search_index.run_refresh_loop(products_collection))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Close database connection on shutdown"""
     logger.info("Shutting down Souq Express API...")
+    app.state.search_refresh.cancel()
+    await helpful_votes.stop()
+    passwords.shutdown()
     client.close()
\ No newline at end of file
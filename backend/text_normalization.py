@@ -0,0 +1,58 @@
+"""
+Text normalization for search.
+
+Shoppers type Arabic with inconsistent alef/hamza forms, taa marbuta versus
+haa, tatweel and diacritics. Both indexed text and queries go through the
+same pipeline so those variants collapse to one form.
+"""
+import re
+import unicodedata
+from typing import List
+
+# Tashkeel (fathatan .. sukun), superscript alef and tatweel
+_DIACRITICS_RE = re.compile("[\u064B-\u0652\u0670\u0640]")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_CHAR_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+    "ؤ": "و",
+    "ئ": "ي",
+    # Arabic-Indic and Persian digits
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+})
+
+# Definite article prefixes, longest first
+_ARTICLE_PREFIXES = ("وال", "بال", "فال", "كال", "لل", "ال")
+_MIN_STEM_LENGTH = 2
+
+def normalize_text(text: str) -> str:
+    """Fold case, diacritics and Arabic letter variants"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _DIACRITICS_RE.sub("", text)
+    return text.translate(_CHAR_MAP)
+
+def strip_article(token: str) -> str:
+    """Remove a leading Arabic definite article (الهاتف -> هاتف)"""
+    for prefix in _ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= _MIN_STEM_LENGTH:
+            return token[len(prefix):]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Normalize text and split it into search tokens"""
+    return [strip_article(token) for token in _TOKEN_RE.findall(normalize_text(text))]
+
+def char_ngrams(token: str, n: int = 3) -> List[str]:
+    """Character n-grams of a token padded with boundary markers"""
+    padded = f"${token}$"
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
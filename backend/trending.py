@@ -0,0 +1,103 @@
+"""
+Trending products leaderboard with exponential time decay.
+
+Scores use forward decay: an event at time t adds `weight * exp(λ·t)`
+(t measured from a fixed epoch) to the product's score. Older events are
+never rewritten, yet their share of the total shrinks at rate λ relative to
+new ones, so ordering by the stored score is ordering by decayed score.
+
+`exp(λ·t)` outgrows float range within years (days, with a short
+half-life), so the natural log of the score is stored instead. An event
+adds `log(weight) + λ·t` through a log-sum-exp update, which keeps every
+write a single update and every read an index walk over the top N
+documents of `trending_scores`, with no epoch to move forward.
+
+Trending is a side effect of reviews and orders: a failed update is
+logged and never fails the write that triggered it.
+"""
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+trending_collection = db.trending_scores
+
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', '72'))
+DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+TRENDING_EPOCH = datetime(2025, 1, 1)
+
+# Event weights
+REVIEW_WEIGHT = 1.0          # scaled by rating / 5
+ORDER_UNIT_WEIGHT = 3.0      # per unit ordered
+# Orders count toward trending when they enter one of these statuses
+TRENDING_ORDER_STATUSES = {"confirmed"}
+
+def log_decayed_weight(weight: float, at: Optional[datetime] = None) -> float:
+    """Log of the forward-decayed contribution of an event happening at `at`"""
+    at = at or datetime.utcnow()
+    return math.log(weight) + DECAY_RATE * (at - TRENDING_EPOCH).total_seconds()
+
+def _log_add(current: Any, value: float) -> Dict[str, Any]:
+    """log(exp(current) + exp(value)) without leaving float range"""
+    return {"$add": [
+        {"$max": [current, value]},
+        {"$ln": {"$add": [1, {"$exp": {"$multiply": [-1, {"$abs": {"$subtract": [current, value]}}]}}]}}
+    ]}
+
+def _score_update(product_id: str, weight: float, now: datetime) -> UpdateOne:
+    # Documents written before log scores carry a plain `score`
+    current = {"$ifNull": ["$logScore", {"$cond": [{"$gt": ["$score", 0]}, {"$ln": "$score"}, None]}]}
+    log_weight = log_decayed_weight(weight, now)
+    return UpdateOne(
+        {"productId": product_id},
+        [
+            {"$set": {"_current": current}},
+            {"$set": {
+                "logScore": {"$cond": [
+                    {"$eq": ["$_current", None]},
+                    log_weight,
+                    _log_add("$_current", log_weight)
+                ]},
+                "updatedAt": now
+            }},
+            {"$unset": ["_current", "score"]}
+        ],
+        upsert=True
+    )
+
+async def _write_scores(updates: List[UpdateOne]):
+    try:
+        await trending_collection.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logger.error(f"Updating trending scores failed: {e}")
+
+async def record_review(product_id: str, rating: int):
+    """Bump a product after a review is written"""
+    if rating > 0:
+        await _write_scores([_score_update(product_id, REVIEW_WEIGHT * rating / 5, datetime.utcnow())])
+
+async def record_order(order: Dict[str, Any]):
+    """Bump every product in an order by the quantity ordered"""
+    now = datetime.utcnow()
+    quantities: Dict[str, int] = {}
+    for item in order.get("items", []):
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item.get("quantity", 1)
+    updates = [
+        _score_update(product_id, ORDER_UNIT_WEIGHT * quantity, now)
+        for product_id, quantity in quantities.items()
+        if quantity > 0
+    ]
+    if updates:
+        await _write_scores(updates)
+
+async def top_product_ids(limit: int) -> List[str]:
+    """Ids of the highest scoring products, best first"""
+    cursor = trending_collection.find({}, {"_id": 0, "productId": 1}).sort("logScore", -1).limit(limit)
+    return [entry["productId"] for entry in await cursor.to_list(limit)]
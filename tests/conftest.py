@@ -0,0 +1,260 @@
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+def _get(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def _set(document, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+def _unset(document, path):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part, {})
+    document.pop(last, None)
+
+def _sort_key(value):
+    # Null and missing sort below every value, as in MongoDB
+    return (value is not None, value if value is not None else 0)
+
+def _compare(value, operator, operand):
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$exists":
+        return (value is not None) == operand
+    # Range operators never match null, as in MongoDB
+    if value is None:
+        return False
+    return {
+        "$gt": lambda: value > operand,
+        "$gte": lambda: value >= operand,
+        "$lt": lambda: value < operand,
+        "$lte": lambda: value <= operand,
+    }[operator]()
+
+def matches(document, filter_dict):
+    """Evaluate the subset of the MongoDB query language the backend uses"""
+    for key, condition in filter_dict.items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            value = _get(document, key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif _get(document, key) != condition:
+            return False
+    return True
+
+def evaluate(expression, document):
+    """Evaluate the aggregation expressions used in update pipelines"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(document, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict) or len(expression) != 1:
+        return expression
+    (operator, args), = expression.items()
+    if not operator.startswith("$"):
+        return expression
+    if operator == "$cond":
+        # Only the chosen branch is evaluated, as in MongoDB
+        condition, if_true, if_false = args
+        return evaluate(if_true if evaluate(condition, document) else if_false, document)
+    values = evaluate(args, document)
+    if operator == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if operator == "$add":
+        return sum(values)
+    if operator == "$subtract":
+        return values[0] - values[1]
+    if operator == "$multiply":
+        return values[0] * values[1]
+    if operator == "$divide":
+        return values[0] / values[1]
+    if operator == "$round":
+        return round(values[0], values[1])
+    if operator == "$gt":
+        return values[0] is not None and values[0] > values[1]
+    if operator == "$eq":
+        return values[0] == values[1]
+    raise NotImplementedError(operator)
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for field, order in reversed(keys):
+            self.documents.sort(key=lambda document: _sort_key(_get(document, field)), reverse=order < 0)
+        return self
+
+    def skip(self, count):
+        self.documents = self.documents[count:]
+        return self
+
+    def limit(self, count):
+        if count:
+            self.documents = self.documents[:count]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        return self.documents if length is None else self.documents[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+class FakeCollection:
+    """In-memory stand-in for a Motor collection, enough for unit tests"""
+
+    def __init__(self, documents=(), name="fake"):
+        self.name = name
+        self.documents = [copy.deepcopy(document) for document in documents]
+        self.bulk_writes = []
+
+    def _project(self, document, projection):
+        document = copy.deepcopy(document)
+        document.pop("_id", None)
+        if projection:
+            included = [field for field, flag in projection.items() if flag and field != "_id"]
+            if included:
+                return {field: document[field] for field in included if field in document}
+            for field, flag in projection.items():
+                if not flag:
+                    document.pop(field, None)
+        return document
+
+    def find(self, filter_dict=None, projection=None):
+        return FakeCursor([self._project(d, projection) for d in self.documents if matches(d, filter_dict or {})])
+
+    async def find_one(self, filter_dict=None, projection=None, sort=None):
+        cursor = self.find(filter_dict, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.documents[0] if cursor.documents else None
+
+    async def count_documents(self, filter_dict):
+        return sum(1 for d in self.documents if matches(d, filter_dict))
+
+    async def insert_one(self, document):
+        self.documents.append(copy.deepcopy(document))
+
+    async def find_one_and_delete(self, filter_dict):
+        for index, document in enumerate(self.documents):
+            if matches(document, filter_dict):
+                return self.documents.pop(index)
+        return None
+
+    def _apply_update(self, document, update):
+        if isinstance(update, list):
+            for stage in update:
+                (operator, fields), = stage.items()
+                if operator == "$set":
+                    values = {path: evaluate(expression, document) for path, expression in fields.items()}
+                    for path, value in values.items():
+                        _set(document, path, value)
+                elif operator == "$unset":
+                    for path in fields:
+                        _unset(document, path)
+            return
+        for path, value in update.get("$set", {}).items():
+            _set(document, path, copy.deepcopy(value))
+        for path, amount in update.get("$inc", {}).items():
+            _set(document, path, (_get(document, path) or 0) + amount)
+
+    async def update_one(self, filter_dict, update, upsert=False):
+        for document in self.documents:
+            if matches(document, filter_dict):
+                self._apply_update(document, update)
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            document = {k: v for k, v in filter_dict.items() if not k.startswith("$") and not isinstance(v, dict)}
+            if isinstance(update, dict):
+                for path, value in update.get("$setOnInsert", {}).items():
+                    _set(document, path, value)
+            self._apply_update(document, update)
+            self.documents.append(document)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=document.get("id"))
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.bulk_writes.append(operations)
+        matched = upserted = 0
+        for operation in operations:
+            result = await self.update_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+            matched += result.matched_count
+            upserted += 0 if result.matched_count else 1
+        return SimpleNamespace(matched_count=matched, upserted_count=upserted)
+
+    async def _group(self, documents, spec):
+        groups = {}
+        for document in documents:
+            key = evaluate(spec["_id"], document)
+            group = groups.setdefault(key, {"_id": key})
+            for field, accumulator in spec.items():
+                if field == "_id":
+                    continue
+                (operator, expression), = accumulator.items()
+                assert operator == "$sum"
+                group[field] = group.get(field, 0) + evaluate(expression, document)
+        return list(groups.values())
+
+    def aggregate(self, pipeline, **kwargs):
+        async def run():
+            documents = [copy.deepcopy(d) for d in self.documents]
+            for stage in pipeline:
+                (operator, spec), = stage.items()
+                if operator == "$match":
+                    documents = [d for d in documents if matches(d, spec)]
+                elif operator == "$group":
+                    documents = await self._group(documents, spec)
+                else:
+                    raise NotImplementedError(operator)
+            return documents
+
+        class Aggregation:
+            async def to_list(self, length):
+                return await run()
+
+            def __aiter__(self):
+                return self._iterate()
+
+            async def _iterate(self):
+                for document in await run():
+                    yield document
+
+        return Aggregation()
+
+@pytest.fixture
+def fake_collection():
+    """Factory for in-memory collections: `fake_collection(documents)`"""
+    return FakeCollection
@@ -0,0 +1,34 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+pytest.importorskip("motor")
+
+from analytics import _next_bucket, _to_utc, _truncate
+from order_rollups import local_day
+
+RIYADH = ZoneInfo("Asia/Riyadh")
+
+def test_local_day_uses_the_reporting_timezone():
+    # 22:30 UTC is already the next day in Riyadh (UTC+3)
+    assert local_day(datetime(2024, 3, 9, 22, 30), "Asia/Riyadh") == "2024-03-10"
+    assert local_day(datetime(2024, 3, 9, 22, 30), "UTC") == "2024-03-09"
+
+def test_weeks_start_on_sunday():
+    wednesday = datetime(2024, 3, 13, 15, 45, tzinfo=RIYADH)
+    assert _truncate(wednesday, "week") == datetime(2024, 3, 10, tzinfo=RIYADH)
+    sunday = datetime(2024, 3, 10, 1, 0, tzinfo=RIYADH)
+    assert _truncate(sunday, "week") == datetime(2024, 3, 10, tzinfo=RIYADH)
+
+def test_truncate_hour_and_month():
+    moment = datetime(2024, 3, 13, 15, 45, 12, tzinfo=RIYADH)
+    assert _truncate(moment, "hour") == datetime(2024, 3, 13, 15, tzinfo=RIYADH)
+    assert _truncate(moment, "month") == datetime(2024, 3, 1, tzinfo=RIYADH)
+
+def test_next_month_rolls_over_the_year():
+    assert _next_bucket(datetime(2024, 12, 1, tzinfo=RIYADH), "month") == datetime(2025, 1, 1, tzinfo=RIYADH)
+    assert _next_bucket(datetime(2024, 1, 1, tzinfo=RIYADH), "month") == datetime(2024, 2, 1, tzinfo=RIYADH)
+
+def test_bucket_keys_are_naive_utc():
+    assert _to_utc(datetime(2024, 3, 10, tzinfo=RIYADH)) == datetime(2024, 3, 9, 21, 0)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl_cache = TTLCache(ttl=10)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2, ttl=30)
+    now[0] += 15
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.get("b") == 2
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache(ttl=60, max_size=2)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+def test_invalidate_where():
+    ttl_cache = TTLCache(ttl=60)
+    ttl_cache.set(("alice", 1), "x")
+    ttl_cache.set(("bob", 1), "y")
+    ttl_cache.invalidate_where(lambda key: key[0] == "alice")
+    assert len(ttl_cache) == 1
+    assert ttl_cache.get(("bob", 1)) == "y"
+
+def test_concurrent_loads_share_one_call():
+    ttl_cache = TTLCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(ttl_cache.get_or_load("key", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+    assert ttl_cache.get("key") == "value"
+
+def test_failed_load_is_not_cached():
+    ttl_cache = TTLCache(ttl=60)
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def succeeding():
+        return 42
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ttl_cache.get_or_load("key", failing))
+    assert asyncio.run(ttl_cache.get_or_load("key", succeeding)) == 42
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("pydantic")
+
+from catalog_io import (
+    MAX_REPORTED_ERRORS, ImportFileError, ImportReport, _coerce_csv_row, build_export_filter,
+    export_products, export_watermark, import_products, iter_rows
+)
+
+PRODUCT = {
+    "title": "هاتف", "titleEn": "Phone", "price": 10, "originalPrice": 12, "image": "a.jpg",
+    "categoryId": "c1", "sellerId": "s1", "description": "Nice"
+}
+
+def csv_bytes(rows, encoding="utf-8"):
+    header = list(rows[0])
+    lines = [",".join(header)] + [",".join(str(row.get(field, "")) for field in header) for row in rows]
+    return ("\n".join(lines) + "\n").encode(encoding)
+
+def test_coerce_csv_row_parses_lists_and_drops_empty_cells():
+    row = _coerce_csv_row({
+        "title": "x", "images": "a.jpg| b.jpg ||", "specifications": '[{"key": "k", "value": "v"}]',
+        "description": "", None: "extra"
+    })
+    assert row == {"title": "x", "images": ["a.jpg", "b.jpg"], "specifications": [{"key": "k", "value": "v"}]}
+
+def test_iter_rows_reports_bad_lines_with_their_numbers():
+    ndjson = b'{"title": "a"}\n\nnot json\n[1]\n'
+    rows = list(iter_rows(io.BytesIO(ndjson), "ndjson"))
+    assert rows[0] == (1, {"title": "a"})
+    assert rows[1][0] == 3 and isinstance(rows[1][1], ValueError)
+    assert rows[2] == (4, [1])
+
+    csv_data = '﻿title,specifications\na,not json\nb,\n'.encode("utf-8")
+    rows = list(iter_rows(io.BytesIO(csv_data), "csv"))
+    assert rows[0][0] == 2 and isinstance(rows[0][1], ValueError)
+    assert rows[1] == (3, {"title": "b"})
+
+def test_import_report_caps_reported_errors():
+    report = ImportReport()
+    for row in range(MAX_REPORTED_ERRORS + 5):
+        report.add_error(row, "bad")
+    summary = report.dict()
+    assert summary["failed"] == MAX_REPORTED_ERRORS + 5
+    assert len(summary["errors"]) == MAX_REPORTED_ERRORS
+    assert summary["errorsTruncated"] is True
+
+def test_import_upserts_valid_rows_and_reports_invalid_ones(fake_collection):
+    collection = fake_collection([{"id": "p1", **PRODUCT, "rating": 4.5, "reviewCount": 2}])
+    upload = "\n".join([
+        json.dumps({"id": "p1", **PRODUCT, "price": 8}),
+        json.dumps({**PRODUCT, "titleEn": "New"}),
+        json.dumps({"title": "missing fields"}),
+    ]).encode("utf-8")
+    written = []
+
+    report = asyncio.run(import_products(collection, io.BytesIO(upload), "ndjson", lambda pid, p: written.append(pid)))
+
+    assert (report["processed"], report["inserted"], report["updated"], report["failed"]) == (3, 1, 1, 1)
+    assert report["errors"][0]["row"] == 3
+    assert len(written) == 2
+    existing = collection.documents[0]
+    assert existing["price"] == 8 and existing["rating"] == 4.5
+    assert collection.documents[1]["titleEn"] == "New"
+    assert collection.documents[1]["reviewCount"] == 0
+
+def test_import_rejects_non_utf8_before_writing(fake_collection):
+    collection = fake_collection()
+    upload = csv_bytes([{**PRODUCT}] * 3, encoding="cp1256")
+    with pytest.raises(ImportFileError, match="line 2"):
+        asyncio.run(import_products(collection, io.BytesIO(upload), "csv", lambda *args: None))
+    assert collection.documents == []
+
+def test_export_filter_bounds():
+    since = datetime(2024, 1, 1)
+    assert build_export_filter("c1", None, since) == {"categoryId": "c1", "updatedAt": {"$gte": since}}
+    bounded = build_export_filter(after=(since, "b"), until=(since, "d"))
+    assert len(bounded["$and"]) == 2
+
+def exported_ids(collection, **bounds):
+    async def run():
+        chunks = [chunk async for chunk in export_products(collection, build_export_filter(**bounds), "ndjson")]
+        return [json.loads(line)["id"] for line in b"".join(chunks).decode("utf-8").splitlines()]
+    return asyncio.run(run())
+
+def test_watermark_resumes_between_rows_sharing_a_timestamp(fake_collection):
+    stamp = datetime(2024, 1, 1, 12)
+    collection = fake_collection([{"id": product_id, **PRODUCT, "updatedAt": stamp} for product_id in ("a", "b", "c")])
+    collection.documents.append({"id": "z", **PRODUCT, "updatedAt": datetime(2024, 1, 1, 11)})
+
+    until = asyncio.run(export_watermark(collection, build_export_filter()))
+    assert until == (stamp, "c")
+    assert exported_ids(collection, until=until) == ["z", "a", "b", "c"]
+
+    # Written later with the same timestamp: only the new row is exported
+    collection.documents.append({"id": "d", **PRODUCT, "updatedAt": stamp})
+    next_until = asyncio.run(export_watermark(collection, build_export_filter(after=until)))
+    assert next_until == (stamp, "d")
+    assert exported_ids(collection, after=until, until=next_until) == ["d"]
+
+    # Nothing new: bounding on (position, position] exports nothing
+    assert exported_ids(collection, after=next_until, until=next_until) == []
+
+def test_csv_export_round_trips_through_the_importer(fake_collection):
+    collection = fake_collection([{"id": "a", **PRODUCT, "images": ["1.jpg", "2.jpg"], "updatedAt": datetime(2024, 1, 1)}])
+
+    async def run():
+        return b"".join([chunk async for chunk in export_products(collection, {}, "csv")])
+
+    rows = list(iter_rows(io.BytesIO(asyncio.run(run())), "csv"))
+    assert rows[0][1]["images"] == ["1.jpg", "2.jpg"]
+    assert rows[0][1]["titleEn"] == "Phone"
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pymongo.errors import BulkWriteError
+
+from counter_buffer import CounterBuffer
+
+def votes(collection):
+    return {document["id"]: document.get("helpful", 0) for document in collection.documents}
+
+@pytest.fixture
+def reviews(fake_collection):
+    return fake_collection([{"id": f"r{i}", "helpful": 0} for i in range(5)])
+
+def test_increments_are_coalesced_into_one_update_per_id(reviews):
+    buffer = CounterBuffer(reviews, "helpful")
+    for _ in range(3):
+        buffer.increment("r1")
+    buffer.increment("r2", 2)
+    assert len(buffer) == 2
+    assert buffer.pending("r1") == 3
+
+    asyncio.run(buffer.flush())
+    assert len(reviews.bulk_writes) == 1
+    assert len(reviews.bulk_writes[0]) == 2
+    assert votes(reviews)["r1"] == 3 and votes(reviews)["r2"] == 2
+    assert len(buffer) == 0
+
+def test_discard_drops_unwritten_increments(reviews):
+    buffer = CounterBuffer(reviews, "helpful")
+    buffer.increment("r1")
+    buffer.discard("r1")
+    asyncio.run(buffer.flush())
+    assert reviews.bulk_writes == []
+
+def test_reaching_max_pending_wakes_the_flusher(reviews):
+    async def run():
+        buffer = CounterBuffer(reviews, "helpful", flush_interval=60, max_pending=3)
+        buffer.start()
+        for key in ("r0", "r1", "r2"):
+            buffer.increment(key)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        flushed = list(reviews.bulk_writes)
+        await buffer.stop()
+        return flushed
+
+    flushed = asyncio.run(run())
+    assert len(flushed) == 1 and len(flushed[0]) == 3
+
+def test_stop_flushes_what_is_left(reviews):
+    async def run():
+        buffer = CounterBuffer(reviews, "helpful", flush_interval=60)
+        buffer.start()
+        buffer.increment("r4", 5)
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert votes(reviews)["r4"] == 5
+    assert len(buffer) == 0
+
+class FailingCollection:
+    def __init__(self, error):
+        self.error = error
+
+    async def bulk_write(self, operations, ordered=True):
+        raise self.error
+
+def test_failed_flush_requeues_up_to_max_pending():
+    buffer = CounterBuffer(FailingCollection(RuntimeError("down")), "helpful", max_pending=3)
+    for key in ("a", "b"):
+        buffer.increment(key)
+
+    async def flush_while_new_votes_arrive():
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        buffer.increment("c")
+        buffer.increment("a")
+        await flushing
+
+    asyncio.run(flush_while_new_votes_arrive())
+    assert len(buffer) == 3
+    assert buffer.pending("a") == 2
+
+    for key in ("d", "e"):
+        buffer.increment(key)
+    asyncio.run(buffer.flush())
+    # The failed batch did not grow the buffer past max_pending
+    assert len(buffer) == 3
+
+def test_partial_bulk_failure_requeues_only_failed_updates():
+    error = BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "boom"}], "nModified": 2})
+    buffer = CounterBuffer(FailingCollection(error), "helpful")
+    for key in ("a", "b", "c"):
+        buffer.increment(key, 2)
+
+    asyncio.run(buffer.flush())
+    assert len(buffer) == 1
+    assert buffer.pending("b") == 2
@@ -0,0 +1,68 @@
+import asyncio
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+
+from database import InvalidCursorError, decode_cursor, encode_cursor, get_keyset_results
+
+def raw_token(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+def test_cursor_round_trip():
+    created = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(created, "p1", "next")) == (created, "p1", "next")
+    assert decode_cursor(encode_cursor(4.5, "p2", "prev")) == (4.5, "p2", "prev")
+    assert decode_cursor(encode_cursor(None, "p3", "next")) == (None, "p3", "next")
+
+@pytest.mark.parametrize("token", [
+    raw_token({"v": {"$gt": ""}, "id": "1"}),
+    raw_token({"v": {"$date": "2024-01-01T00:00:00", "$ne": 1}, "id": "1"}),
+    raw_token({"v": {"$foo": 1}, "id": "1"}),
+    raw_token({"v": [1, 2], "id": "1"}),
+    raw_token({"v": 1, "id": {"$ne": None}}),
+    raw_token({"v": 1, "id": "1", "d": "sideways"}),
+    raw_token({"id": "1"}),
+    raw_token(["v", "id"]),
+    "not base64 at all!",
+])
+def test_invalid_cursors_are_rejected(token):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(token)
+
+def test_keyset_pages_walk_every_document_once(fake_collection):
+    # Several documents share one timestamp, so the id tie-breaker matters
+    documents = [{"id": f"p{i:02d}", "createdAt": datetime(2024, 1, 1 + i // 3)} for i in range(10)]
+    collection = fake_collection(documents)
+    expected = [d["id"] for d in sorted(documents, key=lambda d: (d["createdAt"], d["id"]), reverse=True)]
+
+    pages = []
+    cursor = ""
+    while cursor is not None:
+        page = asyncio.run(get_keyset_results(collection, {}, 4, cursor, with_total=False))
+        pages.append(page)
+        cursor = page["next"]
+
+    assert [item["id"] for page in pages for item in page["items"]] == expected
+    assert pages[0]["prev"] is None
+
+    back = asyncio.run(get_keyset_results(collection, {}, 4, pages[1]["prev"], with_total=False))
+    assert back["items"] == pages[0]["items"]
+    assert back["prev"] is None
+
+@pytest.mark.parametrize("sort_order", [1, -1])
+def test_keyset_pages_cross_null_sort_values(fake_collection, sort_order):
+    documents = [{"id": f"p{i}", "price": None if i < 3 else float(i)} for i in range(7)]
+    collection = fake_collection(documents)
+
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        page = asyncio.run(get_keyset_results(collection, {}, 2, cursor, "price", sort_order, with_total=False))
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next"]
+    assert sorted(seen) == sorted(d["id"] for d in documents)
+    assert len(seen) == len(documents)
@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+
+bcrypt = pytest.importorskip("bcrypt")
+
+import passwords
+
+def test_needs_rehash_compares_the_cost_factor():
+    current = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=passwords.BCRYPT_ROUNDS)).decode()
+    cheaper = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode()
+    assert not passwords.needs_rehash(current)
+    assert passwords.needs_rehash(cheaper) == (passwords.BCRYPT_ROUNDS != 4)
+    assert passwords.needs_rehash("not-a-bcrypt-hash")
+
+def test_hash_and_verify_round_trip(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+    hashed = asyncio.run(passwords.hash_password("secret"))
+    assert asyncio.run(passwords.verify_password("secret", hashed))
+    assert not asyncio.run(passwords.verify_password("wrong", hashed))
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+
+import ratings
+from ratings import COUNTED_FIELD, add_review_rating, get_rating_summary, remove_review_rating
+
+def review(review_id, rating, verified=False, counted=True):
+    document = {"id": review_id, "productId": "p1", "rating": rating, "verified": verified}
+    if counted is not None:
+        document[COUNTED_FIELD] = counted
+    return document
+
+@pytest.fixture
+def collections(fake_collection, monkeypatch):
+    products = fake_collection([{"id": "p1", "title": "Phone", "rating": 0, "reviewCount": 0}])
+    reviews = fake_collection()
+    monkeypatch.setattr(ratings, "products_collection", products)
+    monkeypatch.setattr(ratings, "reviews_collection", reviews)
+    return products, reviews
+
+def stats(products):
+    return products.documents[0]["ratingStats"]
+
+def test_summary_installs_baseline_from_counted_reviews(collections):
+    products, reviews = collections
+    reviews.documents += [
+        review("r1", 5, verified=True),
+        review("r2", 4, counted=None),    # written before the flag existed
+        review("r3", 1, counted=False),   # increment still in flight
+    ]
+    summary = asyncio.run(get_rating_summary("p1"))
+    assert summary["count"] == 2
+    assert summary["average"] == 4.5
+    assert summary["histogram"] == {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+    assert summary["percentages"]["5"] == 50.0
+    assert summary["verifiedCount"] == 1
+    assert summary["verifiedShare"] == 0.5
+    assert products.documents[0]["rating"] == 4.5
+    assert products.documents[0]["reviewCount"] == 2
+
+def test_summary_of_missing_product_is_none(collections):
+    assert asyncio.run(get_rating_summary("nope")) is None
+
+def test_new_review_is_counted_once_when_baseline_is_installed(collections):
+    products, reviews = collections
+    reviews.documents.append(review("r1", 3))
+    new = review("r2", 5, verified=True, counted=False)
+    reviews.documents.append(dict(new))
+
+    asyncio.run(add_review_rating("p1", new))
+
+    assert stats(products)["count"] == 2
+    assert stats(products)["sum"] == 8
+    assert stats(products)["verified"] == 1
+    assert products.documents[0]["rating"] == 4.0
+    assert reviews.documents[1][COUNTED_FIELD] is True
+
+def test_increments_keep_derived_fields_in_step(collections):
+    products, reviews = collections
+    for index, rating in enumerate((5, 4, 4)):
+        new = review(f"r{index}", rating, counted=False)
+        reviews.documents.append(dict(new))
+        asyncio.run(add_review_rating("p1", new))
+    assert stats(products)["stars"]["4"] == 2
+    assert products.documents[0]["reviewCount"] == 3
+    assert products.documents[0]["rating"] == 4.3
+
+def test_removing_a_counted_review_decrements(collections):
+    products, reviews = collections
+    new = review("r1", 4, counted=False)
+    reviews.documents.append(dict(new))
+    asyncio.run(add_review_rating("p1", new))
+
+    deleted = asyncio.run(reviews.find_one_and_delete({"id": "r1"}))
+    asyncio.run(remove_review_rating("p1", deleted))
+    assert stats(products)["count"] == 0
+    assert products.documents[0]["rating"] == 0
+
+def test_delete_before_flag_is_undone_by_the_add_path(collections):
+    products, reviews = collections
+    new = review("r1", 2, counted=False)
+    reviews.documents.append(dict(new))
+
+    # The delete lands while the add is still running: it sees the flag unset
+    deleted = asyncio.run(reviews.find_one_and_delete({"id": "r1"}))
+    asyncio.run(remove_review_rating("p1", deleted))
+    asyncio.run(add_review_rating("p1", new))
+
+    assert stats(products)["count"] == 0
+    assert stats(products)["sum"] == 0
+
+def test_deleted_review_is_added_back_before_baseline_decrement(collections):
+    products, reviews = collections
+    reviews.documents += [review("r1", 5), review("r2", 3)]
+    deleted = asyncio.run(reviews.find_one_and_delete({"id": "r2"}))
+
+    asyncio.run(remove_review_rating("p1", deleted))
+
+    assert stats(products)["count"] == 1
+    assert stats(products)["sum"] == 5
+    assert products.documents[0]["rating"] == 5.0
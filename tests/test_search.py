@@ -0,0 +1,128 @@
+import asyncio
+import re
+
+from search import ProductSearchIndex, regex_search_filter
+from text_normalization import char_ngrams, normalize_text, strip_article, tokenize
+
+PRODUCTS = [
+    {"id": "1", "title": "هاتف سامسونج جالاكسي", "titleEn": "Samsung Galaxy S24",
+     "description": "Smartphone", "categoryId": "phones", "sellerId": "a", "price": 900, "inStock": True},
+    {"id": "2", "title": "سماعات جالاكسي", "titleEn": "Galaxy Buds",
+     "description": "Wireless earbuds", "categoryId": "audio", "sellerId": "b", "price": 120, "inStock": True},
+    {"id": "3", "title": "لابتوب ديل", "titleEn": "Dell Laptop",
+     "description": "Laptop for work", "categoryId": "computers", "sellerId": "a", "price": 2500, "inStock": False},
+]
+
+def build_index(products=PRODUCTS):
+    index = ProductSearchIndex()
+    for product in products:
+        index.index_product(product)
+    return index
+
+def test_normalize_folds_arabic_variants_and_diacritics():
+    assert normalize_text("أحمد") == normalize_text("احمد")
+    assert normalize_text("مدرسة") == "مدرسه"
+    assert normalize_text("مُـحَمَّد") == "محمد"
+    assert normalize_text("١٢٣") == "123"
+    assert normalize_text("GALAXY") == "galaxy"
+
+def test_strip_article_keeps_short_stems():
+    assert strip_article("الهاتف") == "هاتف"
+    assert strip_article("بالهاتف") == "هاتف"
+    assert strip_article("الم") == "الم"
+
+def test_tokenize():
+    assert tokenize("الهاتف Galaxy-S24") == ["هاتف", "galaxy", "s24"]
+    assert tokenize("") == []
+
+def test_char_ngrams():
+    assert char_ngrams("ab") == ["$ab", "ab$"]
+    assert char_ngrams("a") == ["$a$"]
+
+def test_exact_match_ranks_title_hits_first():
+    index = build_index()
+    assert index.search("laptop") == ["3"]
+    assert sorted(index.search("galaxy")) == ["1", "2"]
+
+def test_every_token_must_match():
+    index = build_index()
+    assert index.search("galaxy buds") == ["2"]
+    assert index.search("galaxy dell") == []
+
+def test_last_token_is_a_prefix():
+    index = build_index()
+    assert index.search("galaxy bu") == ["2"]
+    assert index.search("lap") == ["3"]
+
+def test_short_trailing_token_boosts_instead_of_filtering():
+    index = build_index()
+    assert index.search("galaxy s") == ["1", "2"]
+
+def test_single_short_token_is_a_prefix():
+    index = build_index()
+    assert index.search("d") == ["3"]
+
+def test_typo_falls_back_to_trigram_similarity():
+    index = build_index()
+    assert index.search("laptpo") == ["3"]
+    assert index.search("wireles earbuds") == ["2"]
+
+def test_arabic_query_matches_variant_spelling():
+    index = build_index()
+    assert index.search("الهاتف") == ["1"]
+
+def test_filters_narrow_results():
+    index = build_index()
+    assert index.search("galaxy", {"categoryId": "audio"}) == ["2"]
+    assert index.search("galaxy", {"maxPrice": 500}) == ["2"]
+    assert index.search("laptop", {"inStock": True}) == []
+
+def test_reindex_and_remove():
+    index = build_index()
+    index.index_product({**PRODUCTS[2], "titleEn": "Dell Notebook", "description": ""})
+    assert index.search("laptop") == []
+    assert index.search("notebook") == ["3"]
+    index.remove_product("3")
+    assert index.search("dell") == []
+    assert len(index) == 2
+    assert index.attributes("3") == {}
+
+def test_refresh_reads_only_recent_changes(fake_collection):
+    from datetime import datetime, timedelta
+
+    old = datetime.utcnow() - timedelta(hours=1)
+    collection = fake_collection([{**product, "updatedAt": old} for product in PRODUCTS])
+    index = ProductSearchIndex()
+    asyncio.run(index.rebuild(collection))
+    assert index.ready
+    assert index.search("galaxy buds") == ["2"]
+
+    collection.documents.append({"id": "4", "titleEn": "Pixel Phone", "updatedAt": datetime.utcnow()})
+    collection.documents[0]["titleEn"] = "Renamed while not indexed"
+    asyncio.run(index.refresh(collection))
+    assert index.search("pixel") == ["4"]
+    # Older documents are not re-read
+    assert index.search("renamed") == []
+
+def test_regex_fallback_escapes_the_query():
+    filter_dict = regex_search_filter(" a.*(b ", {"categoryId": "x", "minPrice": 5, "page": 2})
+    pattern = filter_dict["$or"][0]["title"]["$regex"]
+    assert re.fullmatch(pattern, "a.*(b")
+    assert not re.fullmatch(pattern, "aXXb")
+    assert filter_dict["categoryId"] == "x"
+    assert filter_dict["price"] == {"$gte": 5}
+    assert "page" not in filter_dict
+
+def test_search_facets_are_counted_from_the_index():
+    from facets import count_facets
+
+    index = build_index()
+    result = count_facets(index.attributes(product_id) for product_id in index.search("galaxy"))
+    assert result["total"] == 2
+    assert result["facets"]["categoryId"] == [{"value": "audio", "count": 1}, {"value": "phones", "count": 1}]
+    assert result["facets"]["sellerId"] == [{"value": "a", "count": 1}, {"value": "b", "count": 1}]
+    assert result["facets"]["price"] == [
+        {"min": 100, "max": 250, "count": 1},
+        {"min": 500, "max": 1000, "count": 1}
+    ]
+    assert result["facets"]["inStock"] == [{"value": True, "count": 2}]